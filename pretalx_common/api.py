@@ -0,0 +1,158 @@
+import concurrent.futures
+import json
+import os
+import sys
+import threading
+import urllib.parse
+import requests
+from .dates import parse_pretalx_date
+
+
+def record_key(record, index):
+    """Return the key identifying an object of the Pretalx API: its code, or its ID if it has no code.
+
+    Objects without code and ID are identified by their index in the list they come from.
+    """
+    key = record.get("code", record.get("id"))
+    return key if key is not None else ("index", index)
+
+
+def max_updated(results):
+    """Return the latest value of the updated property of a list of objects, None if none of them has one."""
+    values = [ r["updated"] for r in results if r.get("updated") ]
+    return max(values, key=parse_pretalx_date) if values else None
+
+
+def load_snapshot(path):
+    """Return the results of a snapshot file, None if it does not exist or cannot be read."""
+    try:
+        with open(path, "r") as f:
+            return json.load(f)["results"]
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def write_snapshot(path, results):
+    """Write results atomically in the format of a single page of the API containing all objects."""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump({"count": len(results), "next": None, "previous": None, "results": results}, f)
+    os.replace(tmp_path, path)
+
+
+class PretalxAPI:
+    """Client of the Pretalx REST API fetching all pages of list endpoints.
+
+    Parameters
+    ----------
+    url : string
+        base URL of the Pretalx instance, e.g. https://pretalx.com
+    event : string
+        event slug
+    token : string
+        API token, optional for public endpoints
+    jobs : int
+        maximum number of parallel page requests
+    page_size : int
+        number of objects per page
+    timeout : float
+        connect and read timeout in seconds
+    """
+    def __init__(self, url, event, token=None, jobs=4, page_size=100, timeout=60.0):
+        self.base_url = "{}/api/events/{}/".format(url.rstrip("/"), event)
+        self.headers = {"user-agent": "pretalx-scripts.pretalx_fetch/0.1"}
+        if token:
+            self.headers["Authorization"] = "Token {}".format(token)
+        self.jobs = max(1, jobs)
+        self.page_size = page_size
+        self.timeout = timeout
+        self.local = threading.local()
+
+    def session(self):
+        """Return the HTTP session of the current thread."""
+        session = getattr(self.local, "session", None)
+        if session is None:
+            session = requests.Session()
+            session.headers.update(self.headers)
+            self.local.session = session
+        return session
+
+    def get_page(self, url, params=None):
+        rr = self.session().get(url, params=params, timeout=self.timeout)
+        if rr.status_code != 200:
+            raise Exception("HTTP status code {} for {}".format(rr.status_code, rr.url))
+        return rr.json()
+
+    def endpoint_url(self, endpoint):
+        return urllib.parse.urljoin(self.base_url, endpoint.strip("/") + "/")
+
+    def fetch_all(self, endpoint, params=None):
+        """Return all objects of an endpoint.
+
+        The first page tells the total number of objects. The remaining pages are requested in parallel by offset. If
+        the response has no count, the links to the next pages are followed one after another instead.
+        """
+        url = self.endpoint_url(endpoint)
+        params = dict(params or {})
+        first = self.get_page(url, dict(params, limit=self.page_size, offset=0))
+        results = list(first["results"])
+        count = first.get("count")
+        if count is None:
+            next_url = first.get("next")
+            while next_url:
+                page = self.get_page(next_url)
+                results += page["results"]
+                next_url = page.get("next")
+            return results
+        offsets = range(len(results), count, self.page_size) if results else []
+        with concurrent.futures.ThreadPoolExecutor(self.jobs) as executor:
+            pages = executor.map(lambda o: self.get_page(url, dict(params, limit=self.page_size, offset=o)), offsets)
+            for page in pages:
+                results += page["results"]
+        # Objects may move between pages if they are modified while we are fetching.
+        unique = {}
+        for i, r in enumerate(results):
+            unique[record_key(r, i)] = r
+        return list(unique.values())
+
+    def fetch_keys(self, endpoint, params=None):
+        """Return the set of keys (see record_key) of all objects of an endpoint.
+
+        Only code and ID of the objects are requested using the fields query parameter. Servers ignoring it send the
+        complete objects which gives the same result.
+        """
+        return { record_key(r, i) for i, r in enumerate(self.fetch_all(endpoint, dict(params or {}, fields="code,id"))) }
+
+    def fetch_snapshot(self, endpoint, path, params=None, full=False, updated_param="updated_since"):
+        """Fetch all objects of an endpoint into a snapshot file and return them.
+
+        If the snapshot exists and its objects have an updated property, only objects updated since the latest of
+        them are requested using the query parameter updated_param and merged into the snapshot. Afterwards, the keys
+        of all objects on the server are fetched. Objects deleted on the server are dropped from the snapshot. The
+        snapshot is fetched completely if the server ignores updated_param or if the server has objects missing in
+        the merged snapshot.
+        """
+        params = dict(params or {})
+        old = None if full else load_snapshot(path)
+        since = max_updated(old) if old else None
+        if since is None:
+            results = self.fetch_all(endpoint, params)
+            write_snapshot(path, results)
+            return results
+        changed = self.fetch_all(endpoint, dict(params, **{updated_param: since}))
+        if any(r.get("updated") and parse_pretalx_date(r["updated"]) < parse_pretalx_date(since) for r in changed):
+            sys.stderr.write("{}: server does not support the {} parameter, fetched everything\n".format(endpoint, updated_param))
+            results = changed
+        else:
+            merged = { record_key(r, i): r for i, r in enumerate(old) }
+            for i, r in enumerate(changed):
+                merged[record_key(r, len(old) + i)] = r
+            keys = self.fetch_keys(endpoint, params)
+            if not keys.issubset(merged):
+                sys.stderr.write("{}: {} objects on the server missing in the snapshot, fetching everything\n".format(endpoint, len(keys.difference(merged))))
+                results = self.fetch_all(endpoint, params)
+            else:
+                results = [ r for k, r in merged.items() if k in keys ]
+                sys.stderr.write("{}: {} objects updated since {}, {} deleted\n".format(endpoint, len(changed), since, len(merged) - len(results)))
+        write_snapshot(path, results)
+        return results
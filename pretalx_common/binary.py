@@ -0,0 +1,86 @@
+import os
+import pickle
+
+from .files import file_digest
+from .records import normalize_record
+
+BINARY_SUFFIX = ".pickle"
+BINARY_FORMAT_VERSION = 2
+
+
+def binary_path(path):
+    """Return the path of the binary snapshot of a JSON export."""
+    return path + BINARY_SUFFIX
+
+
+def source_header(path):
+    """Return the header of the snapshot of a JSON file identifying the version of the JSON file."""
+    stat = os.stat(path)
+    return {
+        "version": BINARY_FORMAT_VERSION,
+        "source_size": stat.st_size,
+        "source_mtime_ns": stat.st_mtime_ns,
+        "source_sha256": file_digest(path),
+    }
+
+
+def is_current(header, path):
+    """Check if the header of a snapshot matches the JSON file.
+
+    The file is only hashed if its size matches but its modification time does not. False is returned if the JSON file
+    cannot be read.
+    """
+    if not isinstance(header, dict) or header.get("version") != BINARY_FORMAT_VERSION:
+        return False
+    try:
+        stat = os.stat(path)
+        if stat.st_size != header.get("source_size"):
+            return False
+        if stat.st_mtime_ns == header.get("source_mtime_ns"):
+            return True
+        return file_digest(path) == header.get("source_sha256")
+    except OSError:
+        return False
+
+
+def read_header(path):
+    """Return the header of the binary snapshot of a JSON export without reading the results, None if it cannot be read."""
+    try:
+        with open(binary_path(path), "rb") as f:
+            return pickle.load(f)
+    except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ImportError, ValueError):
+        return None
+
+
+def write_binary(path, results):
+    """Write the results of a JSON export atomically into its binary snapshot.
+
+    The objects are normalized by pretalx_common.records.normalize_record first, i.e. timestamps and scores are stored
+    parsed next to the original values. The snapshot consists of two pickles (protocol 5): a small header with size,
+    modification time and digest of the JSON file and the results.
+    """
+    header = source_header(path)
+    for r in results:
+        normalize_record(r)
+    dest = binary_path(path)
+    tmp_path = dest + ".tmp"
+    with open(tmp_path, "wb") as f:
+        pickle.dump(header, f, protocol=5)
+        pickle.dump(results, f, protocol=5)
+    os.replace(tmp_path, dest)
+
+
+def load_binary(path):
+    """Return the results of a JSON export from its binary snapshot.
+
+    None is returned if there is no snapshot, if it cannot be read or if it is stale, i.e. the JSON file was modified
+    after the snapshot was written. Only the header is read to check this, the results are not unpickled if the
+    snapshot is stale.
+    """
+    try:
+        with open(binary_path(path), "rb") as f:
+            if not is_current(pickle.load(f), path):
+                return None
+            return pickle.load(f)
+    except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ImportError, ValueError):
+        return None
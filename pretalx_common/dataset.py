@@ -0,0 +1,188 @@
+import json
+from .binary import load_binary
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+
+def load_json(path):
+    """Parse a JSON file, using orjson if it is installed."""
+    if orjson is not None:
+        with open(path, "rb") as f:
+            return orjson.loads(f.read())
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def streaming_available():
+    """Check if JSON exports can be parsed incrementally, i.e. if ijson is installed."""
+    return ijson is not None
+
+
+def project(record, fields):
+    """Return a copy of an object containing only the given keys."""
+    return { k: record[k] for k in fields if k in record }
+
+
+def iter_items(path, prefix, stream=False):
+    """Iterate over the items of an array in a JSON file.
+
+    Parameters
+    ----------
+    path : string
+        path of the JSON file
+    prefix : string
+        keys leading to the array separated by dots, e.g. "event.orders"
+    stream : bool
+        parse the file incrementally using ijson and hold only one item in memory at a time
+    """
+    if stream:
+        with open(path, "rb") as f:
+            yield from ijson.items(f, prefix + ".item", use_float=True)
+        return
+    data = load_json(path)
+    for key in prefix.split("."):
+        data = data[key]
+    yield from data
+
+
+def iter_results(path, fields=None, stream=False):
+    """Iterate over the results of a JSON export of the Pretalx API.
+
+    If stream is True, the file is parsed incrementally using ijson and only one object is held in memory at a time.
+    The binary snapshot is not used in this case because it contains all objects with all fields. Otherwise, the
+    results are read from the binary snapshot of the export if it is up to date. If fields is given, only these keys
+    of the objects are kept.
+    """
+    if stream:
+        for r in iter_items(path, "results", True):
+            yield r if fields is None else project(r, fields)
+        return
+    results = load_binary(path)
+    if results is None:
+        results = load_json(path)["results"]
+    if fields is None:
+        yield from results
+        return
+    # Drop the full objects as soon as they have been projected.
+    results.reverse()
+    while results:
+        yield project(results.pop(), fields)
+
+
+def load_results(path, fields=None, stream=False):
+    """Return the results of a JSON export of the Pretalx API as list, see iter_results for the arguments."""
+    if fields is None and not stream:
+        results = load_binary(path)
+        if results is not None:
+            return results
+        return load_json(path)["results"]
+    return list(iter_results(path, fields, stream))
+
+
+class EventDataset:
+    """JSON exports of the Pretalx API of an event.
+
+    Every export is parsed once when it is accessed for the first time. Indexes are built once when they are used for
+    the first time. All arguments are optional, accessing an export whose path was not given raises an exception.
+
+    Parameters
+    ----------
+    talks : string
+        path of the export of the /talks endpoint or of the schedule editor
+    submissions : string
+        path of the export of the /submissions endpoint
+    speakers : string
+        path of the export of the /speakers endpoint
+    reviews : string
+        path of the export of the /reviews endpoint
+    rooms : string
+        path of the export of the /rooms endpoint
+    fields : dict of string,list of string
+        keys of the objects to keep by export name, all keys are kept for exports missing in this dictionary
+    stream : bool
+        parse the exports incrementally, requires ijson
+    """
+    def __init__(self, talks=None, submissions=None, speakers=None, reviews=None, rooms=None, fields=None, stream=False):
+        self.paths = {"talks": talks, "submissions": submissions, "speakers": speakers, "reviews": reviews, "rooms": rooms}
+        self.fields = fields or {}
+        self.stream = stream
+        self.data = {}
+        self.indexes = {}
+
+    def results(self, name):
+        """Return the list of objects of an export, parsing the file if it has not been parsed yet."""
+        if name not in self.data:
+            path = self.paths.get(name)
+            if not path:
+                raise Exception("no {} export given".format(name))
+            self.data[name] = load_results(path, self.fields.get(name), self.stream)
+        return self.data[name]
+
+    def drop(self, name):
+        """Forget a parsed export and the indexes to free memory. The file is parsed again if it is accessed later."""
+        self.data.pop(name, None)
+        self.indexes.clear()
+
+    def talks(self):
+        return self.results("talks")
+
+    def submissions(self):
+        return self.results("submissions")
+
+    def speakers(self):
+        return self.results("speakers")
+
+    def reviews(self):
+        return self.results("reviews")
+
+    def rooms(self):
+        return self.results("rooms")
+
+    def index(self, name, build):
+        """Return an index, building it by calling build() if it does not exist yet."""
+        if name not in self.indexes:
+            self.indexes[name] = build()
+        return self.indexes[name]
+
+    def talks_by_code(self):
+        return self.index("talks_by_code", lambda: { t["code"]: t for t in self.talks() })
+
+    def submissions_by_code(self):
+        return self.index("submissions_by_code", lambda: { s["code"]: s for s in self.submissions() })
+
+    def speakers_by_code(self):
+        return self.index("speakers_by_code", lambda: { s["code"]: s for s in self.speakers() })
+
+    def speakers_by_submission(self):
+        """Return lists of speakers by submission code according to the submissions property of the speakers."""
+        def build():
+            result = {}
+            for s in self.speakers():
+                for code in s["submissions"]:
+                    result.setdefault(code, []).append(s)
+            return result
+        return self.index("speakers_by_submission", build)
+
+    def reviews_by_submission(self):
+        """Return lists of reviews by submission code."""
+        def build():
+            result = {}
+            for r in self.reviews():
+                result.setdefault(r["submission"], []).append(r)
+            return result
+        return self.index("reviews_by_submission", build)
+
+    def rooms_by_id(self):
+        return self.index("rooms_by_id", lambda: { r["id"]: r for r in self.rooms() })
+
+    def rooms_by_name(self, locale):
+        """Return rooms by their name in a locale."""
+        return self.index(("rooms_by_name", locale), lambda: { r["name"][locale]: r for r in self.rooms() })
@@ -0,0 +1,39 @@
+import datetime
+import functools
+
+PRETALX_DATE_FMT = "%Y-%m-%dT%H:%M:%S%z"
+
+
+@functools.lru_cache(maxsize=8192)
+def parse_pretalx_date(d):
+    """Parse a timestamp returned by the Pretalx API, e.g. '2024-06-10T09:00:00+02:00'.
+
+    Results are cached because the same timestamps are parsed again and again (time filters, metasessions, sessions).
+    """
+    try:
+        return datetime.datetime.fromisoformat(d)
+    except ValueError:
+        # fromisoformat of Python < 3.11 does not support all formats, remove last colon and use strptime
+        return datetime.datetime.strptime(d[:22] + d[-2:], PRETALX_DATE_FMT)
+
+
+def record_datetime(record, key):
+    """Return a timestamp of an object of the Pretalx API as datetime object.
+
+    The value parsed by pretalx_common.records.normalize_record (KEY_datetime) is used if it is present.
+    """
+    parsed = record.get(key + "_datetime")
+    if parsed is not None:
+        return parsed
+    return parse_pretalx_date(record[key])
+
+
+def parse_talk_times(talk):
+    """Parse start and end of a talk once and store them as datetime objects as 'start_datetime' and 'end_datetime'.
+
+    The talk needs top-level 'start' and 'end' properties like talks from the editor API. Values already parsed by
+    the binary snapshot are kept.
+    """
+    talk["start_datetime"] = record_datetime(talk, "start")
+    talk["end_datetime"] = record_datetime(talk, "end")
+    return talk
@@ -0,0 +1,10 @@
+import hashlib
+
+
+def file_digest(path):
+    """Return SHA-256 hex digest of the content of a file."""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1048576), b""):
+            h.update(chunk)
+    return h.hexdigest()
@@ -0,0 +1,12 @@
+import multiprocessing
+import sys
+
+
+def fork_available():
+    """Check if worker processes can be started by forking.
+
+    The scripts have no main guard and their workers inherit the data of the parent process, therefore parallel work
+    requires the fork start method. It is not available on Windows and not safe on macOS if system frameworks are
+    loaded, e.g. by Matplotlib.
+    """
+    return sys.platform != "darwin" and "fork" in multiprocessing.get_all_start_methods()
@@ -0,0 +1,37 @@
+from .dates import parse_pretalx_date
+
+# timestamps parsed by normalize_record
+DATE_FIELDS = ["start", "end"]
+
+
+def review_score(review):
+    """Return the score of a review as float, None if the review has no score.
+
+    The score parsed by normalize_record is used if it is present.
+    """
+    if "score_float" in review:
+        return review["score_float"]
+    score = review.get("score")
+    if score is None or score == "":
+        return None
+    return float(score)
+
+
+def normalize_record(record):
+    """Add parsed values to an object of a JSON export of the Pretalx API and return it.
+
+    Timestamps in the fields 'start' and 'end' of the object, of its slot and of its slots are stored as datetime
+    objects in 'start_datetime' and 'end_datetime'. The score of a review is stored as float in 'score_float'. The
+    original fields are kept.
+    """
+    slots = record.get("slots")
+    objects = [record, record.get("slot")] + (slots if isinstance(slots, list) else [])
+    for obj in objects:
+        if not isinstance(obj, dict):
+            continue
+        for key in DATE_FIELDS:
+            if isinstance(obj.get(key), str):
+                obj[key + "_datetime"] = parse_pretalx_date(obj[key])
+    if "score" in record:
+        record["score_float"] = review_score(record)
+    return record
@@ -0,0 +1,64 @@
+import hashlib
+import os
+import jinja2
+
+
+def default_cache_directory():
+    """Return the per-user directory of compiled templates (pretalx-scripts/jinja in $XDG_CACHE_HOME or ~/.cache).
+
+    It is created accessible by the current user only. Compiled templates are executed as code, therefore they must
+    not be stored in a directory where other users can write, e.g. the system's temporary directory.
+    """
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    directory = os.path.join(base, "pretalx-scripts", "jinja")
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    os.chmod(directory, 0o700)
+    return directory
+
+
+def bytecode_cache(directory, fingerprint):
+    """Return a bytecode cache storing compiled templates in a directory.
+
+    Jinja2 does not consider the options of an environment (delimiters, autoescape etc.) when it looks up compiled
+    templates in the cache. Therefore, the filenames contain a fingerprint of the options.
+
+    Parameters
+    ----------
+    directory : string
+        cache directory, created if it does not exist. If it is None, the per-user directory returned by
+        default_cache_directory is used.
+    fingerprint : string
+        fingerprint of the environment options
+    """
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    else:
+        directory = default_cache_directory()
+    return jinja2.FileSystemBytecodeCache(directory, "__jinja2_{}_%s.cache".format(fingerprint))
+
+
+def create_environment(searchpath, cache_directory=None, autoescape=False, filters=None, **options):
+    """Build a Jinja2 environment loading templates from the file system with a persistent bytecode cache.
+
+    Parameters
+    ----------
+    searchpath : string or list of string
+        directories to load templates from
+    cache_directory : string
+        directory of the bytecode cache, see bytecode_cache
+    autoescape : bool
+        enable HTML autoescape (for all templates except those with a filename extension of a non-HTML file format)
+    filters : dict of string,function
+        filters to register
+    options : dict
+        further options passed to jinja2.Environment, e.g. delimiters, they have to be strings or booleans
+    """
+    fingerprint = hashlib.sha1(repr((sorted(options.items()), autoescape)).encode("utf-8")).hexdigest()[:12]
+    env = jinja2.Environment(loader=jinja2.FileSystemLoader(searchpath=searchpath),
+                             bytecode_cache=bytecode_cache(cache_directory, fingerprint),
+                             autoescape=jinja2.select_autoescape(default=True) if autoescape else False,
+                             undefined=jinja2.StrictUndefined,
+                             **options)
+    if filters:
+        env.filters.update(filters)
+    return env
@@ -0,0 +1,123 @@
+import contextlib
+import http.server
+import io
+import json
+import os
+import os.path
+import sys
+import tempfile
+import threading
+import unittest
+import urllib.parse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+
+from pretalx_common.api import PretalxAPI, load_snapshot
+
+
+def submission(i, updated="2024-01-01T00:00:00+00:00"):
+    return {"code": "S{:04d}".format(i), "title": "Talk {}".format(i), "updated": updated}
+
+
+class APIHandler(http.server.BaseHTTPRequestHandler):
+    """Serve server.objects as paged list endpoint. Offsets in server.failing_offsets are answered with 500."""
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        server = self.server
+        url = urllib.parse.urlsplit(self.path)
+        query = dict(urllib.parse.parse_qsl(url.query))
+        with server.lock:
+            server.queries.append(query)
+            objects = list(server.objects)
+        offset = int(query.get("offset", 0))
+        limit = int(query.get("limit", 25))
+        if offset in server.failing_offsets:
+            body = b"{}"
+            self.send_response(500)
+        else:
+            if server.supports_updated and "updated_since" in query:
+                objects = [ o for o in objects if o["updated"] >= query["updated_since"] ]
+            if "fields" in query:
+                objects = [ { k: o[k] for k in query["fields"].split(",") if k in o } for o in objects ]
+            body = json.dumps({"count": len(objects), "next": None, "previous": None, "results": objects[offset:offset + limit]}).encode()
+            self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class PretalxAPITest(unittest.TestCase):
+    def setUp(self):
+        self.server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), APIHandler)
+        self.server.daemon_threads = True
+        self.server.objects = [ submission(i) for i in range(45) ]
+        self.server.failing_offsets = set()
+        self.server.supports_updated = True
+        self.server.queries = []
+        self.server.lock = threading.Lock()
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.api = PretalxAPI("http://127.0.0.1:{}".format(self.server.server_address[1]), "event", jobs=3, page_size=10)
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "submissions.json")
+        self.stderr = contextlib.redirect_stderr(io.StringIO())
+        self.stderr.__enter__()
+
+    def tearDown(self):
+        self.stderr.__exit__(None, None, None)
+        self.server.shutdown()
+        self.server.server_close()
+        self.directory.cleanup()
+
+    def codes(self, results):
+        return sorted(r["code"] for r in results)
+
+    def test_fetch_all_pages(self):
+        results = self.api.fetch_all("submissions")
+        self.assertEqual(self.codes(results), self.codes(self.server.objects))
+        self.assertEqual(sorted(int(q["offset"]) for q in self.server.queries), [0, 10, 20, 30, 40])
+
+    def test_fetch_all_missing_page(self):
+        self.server.failing_offsets = {20}
+        with self.assertRaises(Exception):
+            self.api.fetch_all("submissions")
+
+    def test_snapshot_keeps_old_file_if_a_page_is_missing(self):
+        self.api.fetch_snapshot("submissions", self.path)
+        self.server.objects[3] = submission(3, "2025-01-01T00:00:00+00:00")
+        self.server.failing_offsets = {0}
+        with self.assertRaises(Exception):
+            self.api.fetch_snapshot("submissions", self.path)
+        self.assertEqual(len(load_snapshot(self.path)), 45)
+
+    def test_snapshot_merges_updated_objects(self):
+        self.api.fetch_snapshot("submissions", self.path)
+        self.server.objects[3] = dict(submission(3, "2025-01-01T00:00:00+00:00"), title="changed")
+        results = self.api.fetch_snapshot("submissions", self.path)
+        self.assertEqual(len(results), 45)
+        self.assertEqual({ r["code"]: r["title"] for r in load_snapshot(self.path) }["S0003"], "changed")
+        self.assertIn("2024-01-01T00:00:00+00:00", [ q.get("updated_since") for q in self.server.queries ])
+
+    def test_snapshot_drops_deleted_objects(self):
+        self.api.fetch_snapshot("submissions", self.path)
+        # The number of objects stays the same.
+        del self.server.objects[5]
+        self.server.objects.append(submission(100, "2025-01-01T00:00:00+00:00"))
+        results = self.api.fetch_snapshot("submissions", self.path)
+        self.assertEqual(self.codes(results), self.codes(self.server.objects))
+        self.assertEqual(self.codes(load_snapshot(self.path)), self.codes(self.server.objects))
+
+    def test_snapshot_without_updated_filter(self):
+        self.api.fetch_snapshot("submissions", self.path)
+        self.server.supports_updated = False
+        self.server.objects = [ submission(i, "2023-01-01T00:00:00+00:00") for i in range(30) ] + [ submission(99, "2025-01-01T00:00:00+00:00") ]
+        results = self.api.fetch_snapshot("submissions", self.path)
+        self.assertEqual(self.codes(results), self.codes(self.server.objects))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,28 @@
+#! /usr/bin/env python3
+
+import argparse
+import os
+import os.path
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from pretalx_common.binary import binary_path, is_current, read_header, write_binary
+from pretalx_common.dataset import load_json
+
+parser = argparse.ArgumentParser(description="Convert JSON exports of the Pretalx API into binary snapshots (FILE{} next to the JSON file) with timestamps and review scores already parsed. The other scripts read the snapshot instead of the JSON file as long as the JSON file is not modified.".format(binary_path("")))
+parser.add_argument("-f", "--force", action="store_true", help="write snapshots even if they are up to date")
+parser.add_argument("input_files", type=str, nargs="+", help="JSON exports")
+args = parser.parse_args()
+
+for path in args.input_files:
+    if not args.force and is_current(read_header(path), path):
+        sys.stderr.write("{}: snapshot is up to date\n".format(path))
+        continue
+    try:
+        results = load_json(path)["results"]
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        sys.stderr.write("ERROR: {}: {}\n".format(path, e))
+        exit(1)
+    write_binary(path, results)
+    sys.stderr.write("{}: {} objects written to {}\n".format(path, len(results), binary_path(path)))
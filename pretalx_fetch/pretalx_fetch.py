@@ -0,0 +1,51 @@
+#! /usr/bin/env python3
+
+import argparse
+import os
+import os.path
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from pretalx_common.api import PretalxAPI
+from pretalx_common.binary import write_binary
+
+DEFAULT_ENDPOINTS = "talks,submissions,speakers,reviews,rooms"
+
+parser = argparse.ArgumentParser(description="Download all objects of Pretalx API endpoints into one JSON snapshot file per endpoint (ENDPOINT.json in the output directory) which can be used as input by the other scripts. Snapshots are updated incrementally if the objects of an endpoint have an 'updated' property.")
+parser.add_argument("-b", "--binary", action="store_true", help="write binary snapshots (see pretalx_binary.py) next to the JSON files")
+parser.add_argument("-e", "--endpoints", type=str, help="comma separated list of endpoints, defaults to {}".format(DEFAULT_ENDPOINTS), default=DEFAULT_ENDPOINTS)
+parser.add_argument("--full", action="store_true", help="fetch all objects even if a snapshot exists")
+parser.add_argument("-j", "--jobs", type=int, help="number of parallel page requests, defaults to 4", default=4)
+parser.add_argument("-p", "--param", type=str, action="append", help="additional query parameter KEY=VALUE sent to all endpoints, e.g. questions=all, can be used multiple times", default=[])
+parser.add_argument("--page-size", type=int, help="number of objects per page, defaults to 100", default=100)
+parser.add_argument("-t", "--token", type=str, help="API token, defaults to the environment variable PRETALX_TOKEN", default=os.environ.get("PRETALX_TOKEN"))
+parser.add_argument("--updated-param", type=str, help="query parameter to request objects updated since a point in time, defaults to 'updated_since'", default="updated_since")
+parser.add_argument("-u", "--url", type=str, help="URL of Pretalx (usually protocol and hostname only)", default="https://pretalx.com")
+parser.add_argument("event", type=str, help="event slug")
+parser.add_argument("output_directory", type=str, help="output directory")
+args = parser.parse_args()
+
+if not os.path.isdir(args.output_directory):
+    sys.stderr.write("ERROR: {} is not a directory\n".format(args.output_directory))
+    exit(1)
+
+params = {}
+for p in args.param:
+    key, sep, value = p.partition("=")
+    if not sep:
+        sys.stderr.write("ERROR: query parameter {} is not in the format KEY=VALUE\n".format(p))
+        exit(1)
+    params[key] = value
+
+api = PretalxAPI(args.url, args.event, args.token, args.jobs, args.page_size)
+for endpoint in [ e.strip() for e in args.endpoints.split(",") if e.strip() ]:
+    path = os.path.join(args.output_directory, "{}.json".format(endpoint))
+    try:
+        results = api.fetch_snapshot(endpoint, path, params, args.full, args.updated_param)
+        if args.binary:
+            write_binary(path, results)
+    except Exception as e:
+        sys.stderr.write("ERROR: {}: {}\n".format(endpoint, e))
+        exit(1)
+    sys.stderr.write("{}: {} objects written to {}\n".format(endpoint, len(results), path))
@@ -3,22 +3,23 @@
 import argparse
 import csv
 import datetime
-import json
+import os.path
 import sys
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from pretalx_common.dataset import EventDataset, streaming_available
+from pretalx_common.dates import record_datetime
+from pretalx_common.records import review_score
+
 
 CET = datetime.timezone(offset=datetime.timedelta(hours=1), name="Europe/Berlin")
-PRETALX_DATE_FORMAT = "%Y-%m-%dT%H:%M:%S%z"
 OUTPUT_DATE_FORMAT = "%d.%m.%Y %H:%M"
 
 def talk_in_range(time_range, talk_slot):
     slot_start = datetime.datetime.strptime(talk_slot["start"], OUTPUT_DATE_FORMAT)
     return slot_start >= time_range[0] and slot_start <= time_range[1]
 
-def transform_pretalx_date(d):
-    """Remove last colon."""
-    return datetime.datetime.strptime(d[:22] + d[-2:], PRETALX_DATE_FORMAT)
-
 def url_to_code(u):
     parts = u.split("/")
     if parts[-1] == "":
@@ -34,9 +35,10 @@ parser.add_argument("--editor-api", action="store_true", help="Talks JSON file i
 parser.add_argument("-l", "--locale", type=str, help="locale of the event", required=True)
 parser.add_argument("--no-repeat", help="don't repeat a speaker (just write a list of speakers, one speaker per line and one line per speaker)", action="store_true")
 parser.add_argument("-q", "--question-answers", help="output answers by speakers on the questions asked in the CfP form", action="store_true")
-parser.add_argument("-R", "--reviews-file", help="reviews JSON file", type=argparse.FileType("r"))
+parser.add_argument("-R", "--reviews-file", help="reviews JSON file", type=str)
 parser.add_argument("--rating", help="output rating (average and count)", action="store_true")
 parser.add_argument("-s", "--state-only", help="only this state (e.g. 'submitted' or 'accepted')", type=str, default=None)
+parser.add_argument("--stream", action="store_true", help="parse the JSON files incrementally to reduce memory usage, requires ijson")
 parser.add_argument("-t", "--type-only", help="only this submission type", type=str, default=None)
 parser.add_argument("-f", "--date_from", help="start date YYYY-mm-dd")
 parser.add_argument("-T", "--date_to", help="end date YYYY-mm-dd")
@@ -49,9 +51,18 @@ if args.rating and not args.reviews_file:
     sys.stderr.write("ERROR: reviews.json missing\n")
     exit(1)
 
-talks = []
-with open(args.talks_file, "r") as infile:
-    talks = json.load(infile)["results"]
+if args.stream and not streaming_available():
+    sys.stderr.write("ERROR: --stream requires the Python package ijson\n")
+    exit(1)
+
+# only these fields are used
+fields = {
+    "talks": ["code", "url", "start", "end", "start_datetime", "end_datetime", "slot", "state", "submission_type", "title", "answers"],
+    "speakers": ["code", "name", "email", "submissions", "answers"],
+    "reviews": ["submission", "score", "score_float"],
+}
+dataset = EventDataset(talks=args.talks_file, speakers=args.speakers_file, reviews=args.reviews_file, fields=fields, stream=args.stream)
+talks = dataset.talks()
 
 # Move start and end of slot if not using data from editor API
 if args.editor_api:
@@ -61,9 +72,7 @@ if args.editor_api:
         talks[i].pop("url", None)
         talks[i]["submission_type"] = {args.locale: talks[i]["submission_type"]}
         talks[i].pop("url", None)
-        talks[i]["slot"] = {"start":  t["start"], "end": t["end"]}
-        talks[i].pop("start", None)
-        talks[i].pop("end", None)
+        talks[i]["slot"] = {k: t.pop(k) for k in ["start", "end", "start_datetime", "end_datetime"] if k in t}
 
 if not args.all:
     talks = [x for x in talks if x.get("slot", None) not in [None, []]]
@@ -74,7 +83,7 @@ for t in talks:
         t["slot"] = {"start": None, "end": None}
         continue
     for field in ["start", "end"]:
-        m = transform_pretalx_date(t["slot"][field][:-3])
+        m = record_datetime(t["slot"], field)
         m = m.astimezone(CET)
         if field == "start":
             t["slot"][field] = m.strftime("%d.%m.%Y %H:%M")
@@ -93,33 +102,19 @@ if args.state_only:
 if args.type_only:
     talks = [t for t in talks if t["submission_type"][args.locale] == args.type_only]
 
-reviews = {}
 if args.reviews_file:
-    reviews_raw = json.load(args.reviews_file)["results"]
     # assign review data to talks
-    for r in reviews_raw:
-        if r["submission"] in reviews:
-            reviews[r["submission"]].append(r)
-        else:
-            reviews[r["submission"]] = [r]
+    reviews = dataset.reviews_by_submission()
     for t in talks:
         reviews_this = reviews.get(t["code"])
         if reviews_this is not None:
             t["ratings_count"] = len(reviews_this)
-            reviews_this_scored = [r for r in reviews_this if r["score"] is not None]
-            if reviews_this_scored is not None:
-                t["ratings_average"] = float(sum([r["score"] for r in reviews_this_scored])) / len(reviews_this_scored)
-
-speakers_by_talk = {}
-spakers = []
-with open(args.speakers_file, "r") as infile:
-    speakers = json.load(infile)["results"]
-
-for s in speakers:
-    for sub in s["submissions"]:
-        talk_info = speakers_by_talk.get(sub, [])
-        talk_info.append({"name": s["name"], "email": s["email"], "code": s["code"], "answers": s["answers"]})
-        speakers_by_talk[sub] = talk_info
+            reviews_this_scored = [s for s in map(review_score, reviews_this) if s is not None]
+            if reviews_this_scored:
+                t["ratings_average"] = float(sum(reviews_this_scored)) / len(reviews_this_scored)
+
+speakers = dataset.speakers()
+speakers_by_talk = dataset.speakers_by_submission()
 
 speakers_with_accepted_submissions = set()
 for t in talks:
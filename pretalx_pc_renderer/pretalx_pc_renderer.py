@@ -1,13 +1,17 @@
 #! /usr/bin/env python3
 
 import argparse
-import jinja2
-import json
 import math
 import os.path
 import re
 import sys
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from pretalx_common.dataset import EventDataset
+from pretalx_common.records import review_score
+from pretalx_common.templates import create_environment
+
 # Define Jinja2 Environment with LaTeX escaping
 def escape_tex(value, linebreaks=False):
     latex_subs = [
@@ -30,10 +34,11 @@ def update_submission(submission, review):
     if not review.get("score", None):
         # reviews do not necessarily have a score, for example by reviewers with a conflict of interest
         return submission
+    score = review_score(review)
     if submission["review_count"] == 0:
-        submission["average_score"] = float(review["score"])
+        submission["average_score"] = score
     else:
-        submission["average_score"] = (float(review["score"]) + submission["review_count"] * submission["average_score"]) / (submission["review_count"] + 1)
+        submission["average_score"] = (score + submission["review_count"] * submission["average_score"]) / (submission["review_count"] + 1)
     submission["review_count"] += 1
     return submission
 
@@ -49,6 +54,7 @@ parser.add_argument("--max-reviews", help="maximum number of reviews to print (u
 parser.add_argument("--order-by", help="oder by one of the following fields: slug, title, average_score", type=str, default="code")
 parser.add_argument("-o", "--output-filename", help="output filename", type=str, required=True)
 parser.add_argument("-r", "--reviews", help="reviews JSON file", type=str)
+parser.add_argument("--template-cache", help="directory to store compiled templates in, defaults to pretalx-scripts/jinja in the user's cache directory (~/.cache)", type=str)
 parser.add_argument("-t", "--type-only", help="write only the following session type", type=str, default="all")
 parser.add_argument("-T", "--track", help="write only the following track", type=str)
 parser.add_argument("submissions", help="submissions JSON file")
@@ -58,44 +64,41 @@ args = parser.parse_args()
 if args.format not in SUPPORTED_FORMATS:
     sys.stderr.write("Unkown output format {}\n".format(args.format))
 
+dataset = EventDataset(submissions=args.submissions, reviews=args.reviews)
+
 # build dict of submissions
-submissions = {}
-with open(args.submissions, "r") as submissions_file:
-    submissions_raw = json.load(submissions_file)
-    if submissions_raw["count"] == 0:
-        sys.stderr.write("ERROR: Submissions file is empty.\n")
-        exit(1)
-    for s in submissions_raw["results"]:
-        s["average_score"] = 0.0
-        s["review_count"] = 0
-        s["reviews"] = []
-        s["speaker_names"] = ", ".join([x["name"] for x in s["speakers"]])
-        # calculate how many reviews to print per talk
-        #TODO move to template
-        #s["print_reviews_count"] = 8 - int(len(s["title"]) / 32) - math.floor(len(speaker_names) / 55)
-        submissions[s["code"]] = s
+if len(dataset.submissions()) == 0:
+    sys.stderr.write("ERROR: Submissions file is empty.\n")
+    exit(1)
+for s in dataset.submissions():
+    s["average_score"] = 0.0
+    s["review_count"] = 0
+    s["reviews"] = []
+    s["speaker_names"] = ", ".join([x["name"] for x in s["speakers"]])
+    # calculate how many reviews to print per talk
+    #TODO move to template
+    #s["print_reviews_count"] = 8 - int(len(s["title"]) / 32) - math.floor(len(speaker_names) / 55)
+submissions = dataset.submissions_by_code()
 
 # add reviews
 if args.reviews:
-    with open(args.reviews, "r") as reviews_file:
-        reviews_raw = json.load(reviews_file)
-        if reviews_raw["count"] == 0:
-            sys.stderr.write("ERROR: Reviews file is empty.\n")
-            exit(1)
-        for r in reviews_raw["results"]:
-            if r["submission"] not in submissions:
-                # Pretalx bug #689: reviews API returns reviews of deleted submissions
-                continue
-            submission = submissions[r["submission"]]
-            name_parts = r["user"].strip().split(" ")
-            if len(name_parts) == 0:
-                r["name_parts"] = ["?"]
-            else:
-                r["name_parts"] = name_parts
-            r["text_length"] = len(r.get("text", ""))
-            r["text"] = r["text"].replace("\r\n", "\n").replace("\n\n", " ")
-            submission["reviews"].append(r)
-            submissions[r["submission"]] = update_submission(submission, r)
+    if len(dataset.reviews()) == 0:
+        sys.stderr.write("ERROR: Reviews file is empty.\n")
+        exit(1)
+    for r in dataset.reviews():
+        if r["submission"] not in submissions:
+            # Pretalx bug #689: reviews API returns reviews of deleted submissions
+            continue
+        submission = submissions[r["submission"]]
+        name_parts = r["user"].strip().split(" ")
+        if len(name_parts) == 0:
+            r["name_parts"] = ["?"]
+        else:
+            r["name_parts"] = name_parts
+        r["text_length"] = len(r.get("text", ""))
+        r["text"] = r["text"].replace("\r\n", "\n").replace("\n\n", " ")
+        submission["reviews"].append(r)
+        submissions[r["submission"]] = update_submission(submission, r)
 
 submissions_list = []
 for code, s in submissions.items():
@@ -117,23 +120,20 @@ submissions_list.sort(key=lambda s: s["{}".format(args.order_by)])
  
 template_directory = os.path.dirname(os.path.abspath(args.template))
 if args.format == "tex":
-    jinja2_env = jinja2.Environment(
-        loader=jinja2.FileSystemLoader(template_directory),
+    jinja2_env = create_environment(
+        template_directory,
+        args.template_cache,
+        filters={'e': escape_tex},
         block_start_string='((%',
         block_end_string='%))',
         variable_start_string='(((',
         variable_end_string=')))',
         comment_start_string='((#',
-        comment_end_string='#))',
-        undefined=jinja2.StrictUndefined
-    )
-    jinja2_env.filters['e'] = escape_tex
-elif args.output_format == "txt":
-    jinja2_env = jinja2.Environment(
-        loader=jinja2.FileSystemLoader(template_directory),
-        undefined=jinja2.StrictUndefined
+        comment_end_string='#))'
     )
+elif args.format == "txt":
+    jinja2_env = create_environment(template_directory, args.template_cache)
 
-template = jinja2_env.get_template(args.template)
+template = jinja2_env.get_template(os.path.basename(args.template))
 with open(args.output_filename, "w") as outfile:
     outfile.write(template.render(talks=submissions_list, max_score=args.max_score, locale=args.locale))
@@ -1,17 +1,43 @@
 #! /usr/bin/env python3
 
-import argpars
+import argparse
 import csv
+import difflib
 import json
+import os.path
+import re
 import sys
 import termcolor
+import unicodedata
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from pretalx_common.dataset import iter_items, streaming_available
+
+RESULT_FIELDS = ["status", "match_by", "confidence", "speaker_name", "speaker_email", "order_code", "order_name", "order_email"]
+# letters which are not decomposed by Unicode normalization or are transliterated differently in German
+TRANSLITERATIONS = str.maketrans({"ä": "ae", "ö": "oe", "ü": "ue", "ß": "ss", "æ": "ae", "ø": "oe", "œ": "oe", "ł": "l", "đ": "d", "þ": "th"})
 
 parser = argparse.ArgumentParser(description="Compare Pretix orders with accepted/confirmed Pretix submissions")
-parser.add_argument("ticket_item_id", type=int, help="item ID of Pretix for tickets")
+parser.add_argument("--csv", type=str, help="write the result of all speakers to this CSV file")
+parser.add_argument("--fuzzy", action="store_true", help="match speakers without matching order by similar names (transliterations, swapped first and last names, middle initials)")
+parser.add_argument("--fuzzy-threshold", type=float, help="minimum similarity of names (0 to 1) for --fuzzy, defaults to 0.85", default=0.85)
+parser.add_argument("--json", type=str, help="write the result of all speakers to this JSON file")
+parser.add_argument("--stream", action="store_true", help="parse the orders export incrementally to reduce memory usage, requires ijson")
+parser.add_argument("ticket_item_id", type=str, help="item ID of Pretix for tickets, multiple IDs can be separated by commas")
 parser.add_argument("speakers_file", help="speakers CSV list generated by Pretalx")
 parser.add_argument("orders_file", help="orders export of Pretix in JSON format")
 args = parser.parse_args()
 
+if args.stream and not streaming_available():
+    sys.stderr.write("ERROR: --stream requires the Python package ijson\n")
+    exit(1)
+try:
+    ticket_item_ids = set(int(i) for i in args.ticket_item_id.split(","))
+except ValueError:
+    sys.stderr.write("ERROR: invalid ticket item ID {}\n".format(args.ticket_item_id))
+    exit(1)
+
 speaker_file_name = args.speakers_file
 orders_file_name = args.orders_file
 
@@ -21,25 +47,128 @@ class Speaker:
         self.email = email.lower()
         self.code = code
 
-orders = []
+
+def normalize_name(name):
+    """Return a name in lower case with whitespace collapsed."""
+    return " ".join(name.casefold().split())
+
+
+def name_tokens(name):
+    """Return the sorted words of a name in lower case ASCII if possible, ignoring initials and punctuation."""
+    s = unicodedata.normalize("NFKD", name.casefold().translate(TRANSLITERATIONS))
+    s = "".join(c for c in s if not unicodedata.combining(c))
+    return sorted(t for t in re.findall(r"\w+", s) if len(t) > 1)
+
+
+class FuzzyNameIndex:
+    """Find the order with the most similar attendee name.
+
+    Names are compared by their sorted words. Only orders sharing the first two letters of at least two words (one if
+    the name has one word) with the name are compared, the similarity is computed by difflib.
+
+    Parameters
+    ----------
+    orders : list of Speaker
+        attendees of the orders
+    """
+    def __init__(self, orders):
+        self.entries = []
+        self.blocks = {}
+        for o in orders:
+            tokens = name_tokens(o.name)
+            if not tokens:
+                continue
+            for t in set(tokens):
+                self.blocks.setdefault(t[:2], []).append(len(self.entries))
+            self.entries.append((" ".join(tokens), o))
+
+    def match(self, name, threshold):
+        """Return the most similar order and the similarity, (None, 0.0) if no order is at least threshold similar."""
+        tokens = name_tokens(name)
+        hits = {}
+        for prefix in set(t[:2] for t in tokens):
+            for i in self.blocks.get(prefix, []):
+                hits[i] = hits.get(i, 0) + 1
+        required = min(2, len(set(t[:2] for t in tokens)))
+        candidates = [ i for i, n in hits.items() if n >= required ]
+        matcher = difflib.SequenceMatcher(b=" ".join(tokens), autojunk=False)
+        best, best_ratio = None, 0.0
+        for i in sorted(candidates):
+            key, o = self.entries[i]
+            matcher.set_seq1(key)
+            if matcher.real_quick_ratio() < threshold or matcher.quick_ratio() < threshold:
+                continue
+            ratio = matcher.ratio()
+            if ratio >= threshold and ratio > best_ratio:
+                best, best_ratio = o, ratio
+        return best, best_ratio
+
+
+def read_orders(path, item_ids, stream):
+    """Return the attendees of all positions of the given items in a Pretix JSON export."""
+    orders = []
+    for o in iter_items(path, "event.orders", stream):
+        for p in o["positions"]:
+            if p.get("item", 0) not in item_ids:
+                continue
+            name = p.get("attendee_name", "")
+            email = p.get("attendee_email", "")
+            if name is None or email is None:
+                continue
+            orders.append(Speaker(name, email, o["code"]))
+    return orders
+
+
+class OrderMatcher:
+    """Find the order of a speaker by name and email, by email, by name or optionally by a similar name.
+
+    The orders are indexed once, every exact lookup takes constant time. If multiple orders match, the first one is
+    returned.
+
+    Parameters
+    ----------
+    orders : list of Speaker
+        attendees of the orders
+    fuzzy_threshold : float
+        minimum similarity of names, no fuzzy matching if None
+    """
+    def __init__(self, orders, fuzzy_threshold=None):
+        self.fuzzy_threshold = fuzzy_threshold
+        self.fuzzy_index = FuzzyNameIndex(orders) if fuzzy_threshold is not None else None
+        self.by_name_email = {}
+        self.by_email = {}
+        self.by_name = {}
+        for o in orders:
+            self.by_name_email.setdefault((o.name, o.email), o)
+            self.by_email.setdefault(o.email, o)
+            self.by_name.setdefault(normalize_name(o.name), o)
+
+    def match(self, speaker):
+        """Return the kind of match ("name+email", "email", "name", "similar_name"), the order and the confidence.
+
+        The confidence is 1.0 for exact matches and the similarity of the names for fuzzy ones. (None, None, None) is
+        returned if nothing matches.
+        """
+        o = self.by_name_email.get((speaker.name, speaker.email))
+        if o is not None:
+            return "name+email", o, 1.0
+        o = self.by_email.get(speaker.email)
+        if o is not None:
+            return "email", o, 1.0
+        o = self.by_name.get(normalize_name(speaker.name))
+        if o is not None:
+            return "name", o, 1.0
+        if self.fuzzy_index is not None:
+            o, ratio = self.fuzzy_index.match(speaker.name, self.fuzzy_threshold)
+            if o is not None:
+                return "similar_name", o, ratio
+        return None, None, None
+
+
 speakers = []
 match_count = 0
 
-# parse JSON
-conf = {}
-with open(orders_file_name) as file_or:
-    conf = json.load(file_or)
-orders_raw = conf["event"]["orders"]
-for o in orders_raw:
-    for p in o["positions"]:
-        if p.get("item", 0) != args.ticket_item_id:
-            continue
-        name = p.get("attendee_name", "")
-        email = p.get("attendee_email", "")
-        code = o["code"]
-        if name is None or email is None: 
-            continue
-        orders.append(Speaker(name, email, code))
+orders = read_orders(orders_file_name, ticket_item_ids, args.stream)
 
 with open(speaker_file_name) as file_sp:
     reader_sp = csv.DictReader(file_sp, delimiter=";")
@@ -53,36 +182,44 @@ orders.sort(key=lambda o: o.name)
 speakers.sort(key=lambda s: s.name)
 
 # check if all speakers in Pretalx have a matching order in Pretix:
-last_sp = speakers[0]
+matcher = OrderMatcher(orders, args.fuzzy_threshold if args.fuzzy else None)
+results = []
+seen = set()
 for sp in speakers:
-    if last_sp.name == sp.name and last_sp.email == sp.email:
+    if (sp.name, sp.email) in seen:
         continue
-    last_sp = sp
-    found = False
-    # try email + name
-    for o in orders:
-        if sp.name == o.name and sp.email == o.email:
-            sys.stdout.write(termcolor.colored("matching order found: {} <{}>\n".format(o.name, o.email), "green"))
-            match_count += 1
-            found = True
-            break
-    if not found:
-        # try email
-        for o in orders:
-            if sp.email == o.email:
-                sys.stdout.write(termcolor.colored("WARNING: email addresses equal found: order name: '{}' order email: '{}' speaker name: '{}' order ID: {}\n".format(o.name, o.email, sp.name, o.code), "yellow"))
-                match_count += 1
-                found = True
-                break
-    if not found:
-        # try name alone 
-        for o in orders:
-            if sp.name == o.name:
-                sys.stdout.write(termcolor.colored("WARNING: equal names found: order name: '{}' order email: '{}' speaker email: '{}' order ID: {}\n".format(o.name, o.email, sp.email, o.code), "yellow"))
-                match_count += 1
-                found = True
-                break
-    if not found:
+    seen.add((sp.name, sp.email))
+    match_by, o, confidence = matcher.match(sp)
+    if match_by == "name+email":
+        sys.stdout.write(termcolor.colored("matching order found: {} <{}>\n".format(o.name, o.email), "green"))
+    elif match_by == "email":
+        sys.stdout.write(termcolor.colored("WARNING: email addresses equal found: order name: '{}' order email: '{}' speaker name: '{}' order ID: {}\n".format(o.name, o.email, sp.name, o.code), "yellow"))
+    elif match_by == "name":
+        sys.stdout.write(termcolor.colored("WARNING: equal names found: order name: '{}' order email: '{}' speaker email: '{}' order ID: {}\n".format(o.name, o.email, sp.email, o.code), "yellow"))
+    elif match_by == "similar_name":
+        sys.stdout.write(termcolor.colored("WARNING: similar names found ({:.2f}): order name: '{}' order email: '{}' speaker name: '{}' speaker email: '{}' order ID: {}\n".format(confidence, o.name, o.email, sp.name, sp.email, o.code), "yellow"))
+    else:
         sys.stdout.write(termcolor.colored("not found: {} <{}>\n".format(sp.name, sp.email), "red"))
+    if o is not None:
+        match_count += 1
+    results.append({
+        "status": "missing" if o is None else ("matched" if match_by == "name+email" else "partial"),
+        "match_by": match_by,
+        "confidence": confidence,
+        "speaker_name": sp.name,
+        "speaker_email": sp.email,
+        "order_code": o.code if o else None,
+        "order_name": o.name if o else None,
+        "order_email": o.email if o else None,
+    })
+
+sys.stdout.write("Matches: {} of {}\n".format(match_count, len(results)))
 
-sys.stdout.write("Matches: {} of {}\n".format(match_count, len(speakers)))
+if args.csv:
+    with open(args.csv, "w") as outfile:
+        writer = csv.DictWriter(outfile, delimiter=";", fieldnames=RESULT_FIELDS)
+        writer.writeheader()
+        writer.writerows(results)
+if args.json:
+    with open(args.json, "w") as outfile:
+        json.dump({"matches": match_count, "speakers": len(results), "results": results}, outfile, indent=1)
@@ -1,97 +1,252 @@
 #! /usr/bin/env python3
 
 import argparse
+import csv
 import enum
-import json
 import math
-from matplotlib import pyplot as plt
-from matplotlib import ticker as mtpl_ticker
+import multiprocessing
+import numpy as np
+import os
 import os.path
 import sys
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from pretalx_common.dataset import EventDataset, streaming_available
+from pretalx_common.processes import fork_available
+from review_statistics import ReviewTable, krippendorff_alpha, normalized_scores, pairwise_agreement, reviewer_statistics, submission_statistics
+import review_plots
+
+# states of submissions which have been up for review
+REVIEWED_STATES = ["submitted", "accepted", "confirmed", "rejected"]
+
 
 class Task(enum.Enum):
     FD_PER_REVIEWER = "frequency_distribution_per_reviewer"
     REVIEW_COUNT_FD = "frequency_distribution_of_reviews_per_submission"
+    REVIEWER_STATS = "reviewer_statistics"
+    SUBMISSION_STATS = "submission_statistics"
+    NORMALIZED_SCORES = "normalized_scores"
+    REVIEWER_AGREEMENT = "reviewer_agreement"
+    SCORE_HEATMAP = "score_heatmap_per_reviewer"
 
     def __str__(self):
         return self.value
 
+    def is_plot(self):
+        return self in [Task.FD_PER_REVIEWER, Task.REVIEW_COUNT_FD, Task.SCORE_HEATMAP]
 
-def col_and_row(idx, row_width):
-    return int(idx / row_width), idx % row_width
+    def needs_submissions(self):
+        return self == Task.REVIEW_COUNT_FD
 
 
-def frequency_distribution_per_reviewer():
-    reviewers = {}
-    # build lists of scores per reviewer
-    for r in reviews:
-        user = r.get("user")
-        score = r.get("score")
-        if user not in reviewers:
-            reviewers[user] = [score]
-        else:
-            reviewers[user].append(score)
-    num_reviewers = len(reviewers)
-    rows = int(math.ceil(num_reviewers / 4.0))
-    cols = 4
-    fig, axes = plt.subplots(ncols=cols, nrows=rows)
-    i = 0
-    for name, scores in reviewers.items():
-        col, row = col_and_row(i, cols)
-        row = i % 4
-        a = axes[col][row]
-        a.hist(scores, [0, 1, 2, 3, 4], align="left", rwidth=0.5)
-        a.set_xlabel("score")
-        a.set_ylabel("count")
-        a.get_yaxis().set_major_locator(mtpl_ticker.MaxNLocator(integer=True, nbins=4))
-        a.get_xaxis().set_major_locator(mtpl_ticker.MaxNLocator(integer=True))
-        if args.pseudonymous:
-            a.set_title("R{}".format(i+1))
-        else:
-            a.set_title(name)
-        i += 1
-    for j in range(i, rows * cols):
-        col, row = col_and_row(j, cols)
-        fig.delaxes(axes[col][row])
-    fig.tight_layout()
-    fig.savefig(args.plot_outfile, format=os.path.splitext(args.plot_outfile.name)[1][1:])
+def parse_tasks(value):
+    """Parse a comma separated list of tasks or 'all'."""
+    if value == "all":
+        return list(Task)
+    try:
+        return [ Task(v.strip()) for v in value.split(",") ]
+    except ValueError:
+        raise argparse.ArgumentTypeError("invalid task list {}, choose from: all, {}".format(value, ", ".join(str(t) for t in Task)))
 
 
-def review_count_frequency_dist():
-    if not args.submissions:
-        sys.stderr.write("ERROR: missing submissions input file\n")
-        exit(1)
-    s = json.load(args.submissions)["results"]
-    submissions = {v["code"]:0 for v in s if v["state"] in ["submitted", "accepted", "confirmed", "rejected"]}
-    for r in reviews:
-        if r["submission"] in submissions:
-            submissions[r["submission"]] += 1
-    numbers = [v for k, v in submissions.items()]
-    fig, ax = plt.subplots(ncols=1, nrows=1)
-    ax.hist(numbers, range(0, max(numbers)), align="left", rwidth=0.5)
-    ax.set_xlabel("reviews")
-    ax.set_ylabel("count")
-    ax.get_yaxis().set_major_locator(mtpl_ticker.MaxNLocator(steps=(1, 5, 10)))
-    ax.get_xaxis().set_major_locator(mtpl_ticker.MaxNLocator(integer=True))
-    fig.savefig(args.plot_outfile, format=os.path.splitext(args.plot_outfile.name)[1][1:])
+def review_table():
+    """Return the reviews as ReviewTable, only reviews of submissions up for review if the submissions are given.
+
+    The table is built once and shared by all tasks.
+    """
+    if "table" not in aggregates:
+        codes = None
+        if args.submissions:
+            codes = {s["code"] for s in dataset.submissions() if s["state"] in REVIEWED_STATES}
+        aggregates["table"] = ReviewTable.from_reviews(dataset.reviews(), codes)
+    return aggregates["table"]
+
+
+def scores_by_reviewer(table):
+    """Return a list of the scores of each reviewer, reviews without score are skipped."""
+    order = np.argsort(table.reviewer_ids, kind="stable")
+    counts = np.bincount(table.reviewer_ids, minlength=len(table.reviewers))
+    scores = np.split(table.scores[order], np.cumsum(counts)[:-1])
+    return [ s[~np.isnan(s)].tolist() for s in scores ]
+
+
+def reviewer_labels(table):
+    if args.pseudonymous:
+        return [ "R{}".format(i+1) for i in range(len(table.reviewers)) ]
+    return list(table.reviewers)
+
+
+def frequency_distribution_per_reviewer(outfile, fmt):
+    """Return the plot function and its arguments."""
+    table = review_table()
+    return review_plots.frequency_distribution_per_reviewer, (scores_by_reviewer(table), reviewer_labels(table), outfile, fmt, args.reviewers_per_page)
+
+
+def score_heatmap_per_reviewer(outfile, fmt):
+    """Return the plot function and its arguments."""
+    table = review_table()
+    scored = table.scored()
+    bin_ids = np.floor(table.scores[scored]).astype(int)
+    first = bin_ids.min() if len(bin_ids) else 0
+    bins = list(range(first, bin_ids.max() + 1 if len(bin_ids) else 1))
+    counts = np.bincount(table.reviewer_ids[scored] * len(bins) + (bin_ids - first), minlength=len(table.reviewers) * len(bins))
+    return review_plots.score_heatmap_per_reviewer, (counts.reshape(len(table.reviewers), len(bins)), bins, reviewer_labels(table), outfile, fmt)
+
+
+def review_count_frequency_dist(outfile, fmt):
+    """Return the plot function and its arguments."""
+    table = review_table()
+    counts = np.bincount(table.submission_ids, minlength=len(table.submissions)).tolist()
+    # submissions without any review
+    codes = {s["code"] for s in dataset.submissions() if s["state"] in REVIEWED_STATES}
+    counts += [0] * len(codes.difference(table.submissions))
+    return review_plots.review_count_frequency_distribution, (counts, outfile, fmt)
+
+
+def format_value(v):
+    """Format a number for CSV output, NaN is written as empty cell."""
+    if isinstance(v, float):
+        return "" if math.isnan(v) else "{:.4f}".format(v)
+    return v
+
+
+def write_csv(outfile, header, rows):
+    writer = csv.writer(outfile, delimiter=";")
+    writer.writerow(header)
+    for row in rows:
+        writer.writerow([format_value(v) for v in row])
+
+
+def reviewer_statistics_csv(outfile):
+    table = review_table()
+    stats = reviewer_statistics(table)
+    labels = reviewer_labels(table)
+    write_csv(outfile, ["reviewer"] + list(stats), ([labels[i]] + [c[i] for c in stats.values()] for i in range(len(table.reviewers))))
+
+
+def submission_statistics_csv(outfile):
+    table = review_table()
+    stats = submission_statistics(table)
+    write_csv(outfile, ["submission"] + list(stats), ([table.submissions[i]] + [c[i] for c in stats.values()] for i in range(len(table.submissions))))
+
+
+def normalized_scores_csv(outfile):
+    table = review_table()
+    z = normalized_scores(table)
+    labels = reviewer_labels(table)
+    write_csv(outfile, ["submission", "reviewer", "score", "normalized_score"],
+              ([table.submissions[s], labels[r], x, y] for s, r, x, y in zip(table.submission_ids, table.reviewer_ids, table.scores, z)))
+
+
+def reviewer_agreement_csv(outfile):
+    table = review_table()
+    common, correlation = pairwise_agreement(table)
+    labels = reviewer_labels(table)
+    count = len(table.reviewers)
+    write_csv(outfile, ["reviewer_a", "reviewer_b", "common_submissions", "correlation"],
+              ([labels[i], labels[j], common[i, j], correlation[i, j]] for i in range(count) for j in range(i + 1, count) if common[i, j] > 0))
+    sys.stdout.write("Krippendorff's alpha (interval): {:.4f}\n".format(krippendorff_alpha(table)))
+
+
+PLOT_TASKS = {
+    Task.FD_PER_REVIEWER: frequency_distribution_per_reviewer,
+    Task.REVIEW_COUNT_FD: review_count_frequency_dist,
+    Task.SCORE_HEATMAP: score_heatmap_per_reviewer,
+}
+CSV_TASKS = {
+    Task.REVIEWER_STATS: reviewer_statistics_csv,
+    Task.SUBMISSION_STATS: submission_statistics_csv,
+    Task.NORMALIZED_SCORES: normalized_scores_csv,
+    Task.REVIEWER_AGREEMENT: reviewer_agreement_csv,
+}
+
+
+def run_plot(plot_function, plot_args):
+    plot_function(*plot_args)
+
+
+def run_plot_task(task, outfile, fmt):
+    """Prepare the data of a plot task and render it."""
+    run_plot(*PLOT_TASKS[task](outfile, fmt))
+
+
+def run_tasks(tasks, directory, plot_format, jobs):
+    """Run multiple tasks writing one file per task into a directory.
+
+    Statistics are computed in this process, plots are prepared and rendered in up to jobs worker processes if they
+    can be forked.
+    """
+    plots = []
+    for task in tasks:
+        if task.is_plot():
+            plots.append((task, os.path.join(directory, "{}.{}".format(task, plot_format)), plot_format))
+        else:
+            with open(os.path.join(directory, "{}.csv".format(task)), "w") as outfile:
+                CSV_TASKS[task](outfile)
+    if jobs <= 1 or len(plots) <= 1 or not fork_available():
+        for p in plots:
+            run_plot_task(*p)
+        return
+    # Build the review table before forking. Only task and path are pickled, the workers read the table and the
+    # parsed exports from the memory inherited from this process.
+    review_table()
+    ctx = multiprocessing.get_context("fork")
+    with ctx.Pool(min(jobs, len(plots))) as pool:
+        pool.starmap(run_plot_task, plots)
 
 
 parser = argparse.ArgumentParser(description="Analyse reviews")
+parser.add_argument("-d", "--output-directory", help="run all tasks given by --task and write one file per task (TASK.csv or TASK.PLOT_FORMAT) into this directory", type=str)
+parser.add_argument("-j", "--jobs", help="number of processes rendering plots in parallel if --output-directory is used (Linux only), defaults to the number of CPUs", type=int, default=os.cpu_count() or 1)
+parser.add_argument("-o", "--csv-outfile", help="write statistics of non-plot tasks to this CSV file", type=argparse.FileType("w"))
 parser.add_argument("-p", "--pseudonymous", action="store_true", help="pseudonymous output")
-parser.add_argument("-P", "--plot-outfile", required=True, help="plot frequency distribution graphs to file", type=argparse.FileType("wb"))
-parser.add_argument("-s", "--submissions", help="submissions export from Pretalx API as JSON", type=argparse.FileType("r"))
-parser.add_argument("-t", "--task", required=True, help="task", type=Task, choices=list(Task))
-parser.add_argument("reviews_file", help="reviews JSON file", type=argparse.FileType("r"))
+parser.add_argument("-P", "--plot-outfile", help="plot frequency distribution graphs to file (required by plot tasks)", type=argparse.FileType("wb"))
+parser.add_argument("--plot-format", help="file format of plots if --output-directory is used, defaults to png", type=str, default="png")
+parser.add_argument("--reviewers-per-page", help="maximum number of reviewers per page of {} (0 for all on one page), pages of PDF files are written into one file, other formats get one file per page, defaults to 16".format(Task.FD_PER_REVIEWER), type=int, default=16)
+parser.add_argument("-s", "--submissions", help="submissions export from Pretalx API as JSON", type=str)
+parser.add_argument("--stream", action="store_true", help="parse the JSON files incrementally to reduce memory usage, requires ijson")
+parser.add_argument("-t", "--task", required=True, help="task, comma separated list of tasks or 'all' (requires --output-directory if more than one task is given). Tasks: {}".format(", ".join(str(t) for t in Task)), type=parse_tasks)
+parser.add_argument("reviews_file", help="reviews JSON file", type=str)
 args = parser.parse_args()
 
-reviews = json.load(args.reviews_file)["results"]
+if args.stream and not streaming_available():
+    sys.stderr.write("ERROR: --stream requires the Python package ijson\n")
+    exit(1)
+
+tasks = args.task
+if not args.submissions:
+    missing = [ t for t in tasks if t.needs_submissions() ]
+    if missing and tasks == list(Task):
+        sys.stderr.write("WARNING: skipping {}, it requires the submissions input file\n".format(", ".join(str(t) for t in missing)))
+        tasks = [ t for t in tasks if not t.needs_submissions() ]
+    elif missing:
+        sys.stderr.write("ERROR: missing submissions input file\n")
+        exit(1)
 
-if not args.plot_outfile:
-    sys.stderr.write("ERROR: No output file. Only plot tasks are supported and they require an output file.")
+if args.output_directory:
+    if not os.path.isdir(args.output_directory):
+        sys.stderr.write("ERROR: {} is not a directory\n".format(args.output_directory))
+        exit(1)
+elif len(tasks) > 1:
+    sys.stderr.write("ERROR: Multiple tasks require --output-directory.\n")
     exit(1)
+elif tasks[0].is_plot() and not args.plot_outfile:
+    sys.stderr.write("ERROR: No output file. Plot tasks require --plot-outfile.\n")
+    exit(1)
+elif not tasks[0].is_plot() and not args.csv_outfile:
+    sys.stderr.write("ERROR: No output file. Statistics tasks require --csv-outfile.\n")
+    exit(1)
+
+# only these fields are used
+fields = {"reviews": ["user", "score", "score_float", "submission"], "submissions": ["code", "state"]}
+dataset = EventDataset(submissions=args.submissions, reviews=args.reviews_file, fields=fields, stream=args.stream)
+# data shared by all tasks
+aggregates = {}
 
-if args.task == Task.FD_PER_REVIEWER:
-    frequency_distribution_per_reviewer()
-elif args.task == Task.REVIEW_COUNT_FD:
-    review_count_frequency_dist()
+if args.output_directory:
+    run_tasks(tasks, args.output_directory, args.plot_format, args.jobs)
+elif tasks[0].is_plot():
+    run_plot_task(tasks[0], args.plot_outfile, os.path.splitext(args.plot_outfile.name)[1][1:])
+else:
+    CSV_TASKS[tasks[0]](args.csv_outfile)
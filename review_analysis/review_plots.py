@@ -0,0 +1,125 @@
+import math
+import matplotlib
+matplotlib.use("Agg")
+from matplotlib import pyplot as plt
+from matplotlib import ticker as mtpl_ticker
+from matplotlib.backends.backend_pdf import PdfPages
+import numpy as np
+import os.path
+
+
+def col_and_row(idx, row_width):
+    return int(idx / row_width), idx % row_width
+
+
+def page_path(outfile, number):
+    """Return the path of a page of a plot written to multiple files, e.g. plot-2.png."""
+    path = outfile if isinstance(outfile, str) else outfile.name
+    stem, ext = os.path.splitext(path)
+    return "{}-{}{}".format(stem, number, ext)
+
+
+def reviewer_histograms(scores, labels):
+    """Return a figure with a histogram of the scores of each reviewer, four per row.
+
+    Every histogram gets the same space. The margins are fixed because tight_layout takes most of the rendering time.
+    """
+    cols = 4
+    rows = max(1, int(math.ceil(len(scores) / float(cols))))
+    width = 3.0 * cols
+    height = 2.5 * rows
+    fig, axes = plt.subplots(ncols=cols, nrows=rows, squeeze=False, figsize=(width, height))
+    fig.subplots_adjust(left=0.6 / width, right=1 - 0.2 / width, bottom=0.5 / height, top=1 - 0.35 / height, wspace=0.45, hspace=0.6)
+    i = 0
+    for name, s in zip(labels, scores):
+        col, row = col_and_row(i, cols)
+        a = axes[col][row]
+        a.hist(s, [0, 1, 2, 3, 4], align="left", rwidth=0.5)
+        a.set_xlabel("score")
+        a.set_ylabel("count")
+        a.get_yaxis().set_major_locator(mtpl_ticker.MaxNLocator(integer=True, nbins=4))
+        a.get_xaxis().set_major_locator(mtpl_ticker.MaxNLocator(integer=True))
+        a.set_title(name)
+        i += 1
+    for j in range(i, rows * cols):
+        col, row = col_and_row(j, cols)
+        fig.delaxes(axes[col][row])
+    return fig
+
+
+def frequency_distribution_per_reviewer(scores, labels, outfile, fmt, per_page=16):
+    """Plot a histogram of the scores of each reviewer.
+
+    The histograms are split into pages of per_page reviewers (all on one page if per_page is 0). Pages are written
+    into one file if the format is PDF. Otherwise, the first page is written to outfile and the following pages to
+    files named like outfile with the page number appended.
+
+    Parameters
+    ----------
+    scores : list of list of float
+        scores of each reviewer
+    labels : list of string
+        title of the histogram of each reviewer
+    outfile : string or file
+        output file
+    fmt : string
+        output format, e.g. png or pdf
+    per_page : int
+        maximum number of reviewers per page
+    """
+    per_page = per_page if per_page > 0 else max(1, len(scores))
+    pages = [ slice(i, i + per_page) for i in range(0, len(scores), per_page) ] or [slice(0, 0)]
+    if fmt == "pdf":
+        with PdfPages(outfile) as pdf:
+            for page in pages:
+                fig = reviewer_histograms(scores[page], labels[page])
+                pdf.savefig(fig)
+                plt.close(fig)
+        return
+    for number, page in enumerate(pages, 1):
+        fig = reviewer_histograms(scores[page], labels[page])
+        fig.savefig(outfile if number == 1 else page_path(outfile, number), format=fmt)
+        plt.close(fig)
+
+
+def score_heatmap_per_reviewer(counts, bins, labels, outfile, fmt):
+    """Plot the share of scores of each reviewer falling into each score bin as one image.
+
+    Parameters
+    ----------
+    counts : numpy.ndarray
+        reviewers × bins matrix of the number of scores
+    bins : list of number
+        score of each bin
+    labels : list of string
+        name of each reviewer
+    outfile : string or file
+        output file
+    fmt : string
+        output format, e.g. png or pdf
+    """
+    totals = counts.sum(axis=1, keepdims=True)
+    shares = np.divide(counts, totals, out=np.zeros(counts.shape), where=totals > 0)
+    fig, ax = plt.subplots(ncols=1, nrows=1, figsize=(2 + 0.6 * len(bins), 1.5 + 0.22 * len(labels)))
+    image = ax.imshow(shares, aspect="auto", interpolation="nearest", cmap="viridis", vmin=0.0)
+    ax.set_xticks(range(len(bins)))
+    ax.set_xticklabels([ "{:g}".format(b) for b in bins ])
+    ax.set_yticks(range(len(labels)))
+    ax.set_yticklabels(labels, fontsize="small")
+    ax.set_xlabel("score")
+    fig.colorbar(image, ax=ax, label="share of reviews")
+    fig.tight_layout()
+    fig.savefig(outfile, format=fmt)
+    plt.close(fig)
+
+
+def review_count_frequency_distribution(counts, outfile, fmt):
+    """Plot a histogram of the number of reviews per submission."""
+    fig, ax = plt.subplots(ncols=1, nrows=1)
+    ax.hist(counts, range(0, max(counts)), align="left", rwidth=0.5)
+    ax.set_xlabel("reviews")
+    ax.set_ylabel("count")
+    ax.get_yaxis().set_major_locator(mtpl_ticker.MaxNLocator(steps=(1, 5, 10)))
+    ax.get_xaxis().set_major_locator(mtpl_ticker.MaxNLocator(integer=True))
+    fig.savefig(outfile, format=fmt)
+    plt.close(fig)
@@ -0,0 +1,192 @@
+import math
+import numpy as np
+
+from pretalx_common.records import review_score
+
+
+class ReviewTable:
+    """Reviews as columnar arrays.
+
+    Parameters
+    ----------
+    reviewers : list of string
+        names of the reviewers, the index in this list is the reviewer ID
+    submissions : list of string
+        submission codes, the index in this list is the submission ID
+    reviewer_ids : numpy.ndarray of int
+        reviewer ID of each review
+    submission_ids : numpy.ndarray of int
+        submission ID of each review
+    scores : numpy.ndarray of float
+        score of each review, NaN if the review has no score
+    """
+    def __init__(self, reviewers, submissions, reviewer_ids, submission_ids, scores):
+        self.reviewers = reviewers
+        self.submissions = submissions
+        self.reviewer_ids = reviewer_ids
+        self.submission_ids = submission_ids
+        self.scores = scores
+
+    def from_reviews(reviews, submission_codes=None):
+        """Build the table from reviews of the Pretalx API.
+
+        Reviewers and submissions are numbered in order of their first review. If submission_codes is given, reviews of
+        other submissions are skipped.
+        """
+        reviewers = {}
+        submissions = {}
+        reviewer_ids = []
+        submission_ids = []
+        scores = []
+        for r in reviews:
+            code = r["submission"]
+            if submission_codes is not None and code not in submission_codes:
+                continue
+            reviewer_ids.append(reviewers.setdefault(r.get("user"), len(reviewers)))
+            submission_ids.append(submissions.setdefault(code, len(submissions)))
+            score = review_score(r)
+            scores.append(math.nan if score is None else score)
+        return ReviewTable(list(reviewers), list(submissions), np.array(reviewer_ids, dtype=np.intp),
+                           np.array(submission_ids, dtype=np.intp), np.array(scores, dtype=float))
+
+    def scored(self):
+        """Return a boolean mask of the reviews having a score."""
+        return ~np.isnan(self.scores)
+
+
+def group_moments(ids, values, size):
+    """Return count, mean and standard deviation of the values of each group, ignoring NaN values.
+
+    Mean and standard deviation are NaN for groups without values.
+    """
+    valid = ~np.isnan(values)
+    ids = ids[valid]
+    values = values[valid]
+    counts = np.bincount(ids, minlength=size)
+    sums = np.bincount(ids, weights=values, minlength=size)
+    squares = np.bincount(ids, weights=values * values, minlength=size)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        means = sums / counts
+        variances = np.maximum(squares / counts - means * means, 0.0)
+    return counts, means, np.sqrt(variances)
+
+
+def pearson(counts, sx, sy, sxx, syy, sxy):
+    """Return Pearson correlation coefficients from sums, NaN if it is undefined."""
+    with np.errstate(invalid="ignore", divide="ignore"):
+        cov = counts * sxy - sx * sy
+        var = (counts * sxx - sx * sx) * (counts * syy - sy * sy)
+        return np.where((counts > 1) & (var > 0), cov / np.sqrt(np.maximum(var, 0.0)), np.nan)
+
+
+def normalized_scores(table):
+    """Return the z-score of each review with respect to all scores given by its reviewer.
+
+    Reviews without score are NaN. Scores of reviewers who gave the same score to all submissions are 0.
+    """
+    _, means, stds = group_moments(table.reviewer_ids, table.scores, len(table.reviewers))
+    mean = means[table.reviewer_ids]
+    std = stds[table.reviewer_ids]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(std > 0, (table.scores - mean) / std, np.where(np.isnan(table.scores), np.nan, 0.0))
+
+
+def reviewer_statistics(table):
+    """Return columns of statistics per reviewer.
+
+    The agreement of a reviewer is the correlation of their normalized scores with the mean normalized score of the
+    other reviewers of the same submission.
+    """
+    size = len(table.reviewers)
+    counts, means, stds = group_moments(table.reviewer_ids, table.scores, size)
+    z = normalized_scores(table)
+    valid = ~np.isnan(z)
+    sub_ids = table.submission_ids[valid]
+    rev_ids = table.reviewer_ids[valid]
+    x = z[valid]
+    sub_counts = np.bincount(sub_ids, minlength=len(table.submissions))[sub_ids]
+    sub_sums = np.bincount(sub_ids, weights=x, minlength=len(table.submissions))[sub_ids]
+    others = sub_counts > 1
+    rev_ids = rev_ids[others]
+    x = x[others]
+    y = (sub_sums[others] - x) / (sub_counts[others] - 1)
+    agreement = pearson(
+        np.bincount(rev_ids, minlength=size),
+        np.bincount(rev_ids, weights=x, minlength=size),
+        np.bincount(rev_ids, weights=y, minlength=size),
+        np.bincount(rev_ids, weights=x * x, minlength=size),
+        np.bincount(rev_ids, weights=y * y, minlength=size),
+        np.bincount(rev_ids, weights=x * y, minlength=size),
+    )
+    return {
+        "reviews": np.bincount(table.reviewer_ids, minlength=size),
+        "scored": counts,
+        "mean": means,
+        "stddev": stds,
+        "agreement": agreement,
+    }
+
+
+def submission_statistics(table):
+    """Return columns of statistics per submission."""
+    size = len(table.submissions)
+    counts, means, stds = group_moments(table.submission_ids, table.scores, size)
+    _, normalized_means, _ = group_moments(table.submission_ids, normalized_scores(table), size)
+    return {
+        "reviews": np.bincount(table.submission_ids, minlength=size),
+        "scored": counts,
+        "mean": means,
+        "stddev": stds,
+        "mean_normalized": normalized_means,
+    }
+
+
+def score_matrix(table):
+    """Return a submissions × reviewers matrix of scores (NaN if missing) and a mask of the scores present.
+
+    If a reviewer reviewed a submission multiple times, the last score is used.
+    """
+    matrix = np.full((len(table.submissions), len(table.reviewers)), np.nan)
+    matrix[table.submission_ids, table.reviewer_ids] = table.scores
+    return matrix, ~np.isnan(matrix)
+
+
+def pairwise_agreement(table):
+    """Return the number of submissions scored by both reviewers and the correlation of their scores on them.
+
+    Both are reviewers × reviewers matrices.
+    """
+    matrix, mask = score_matrix(table)
+    m = mask.astype(float)
+    x = np.where(mask, matrix, 0.0)
+    common = m.T @ m
+    sx = x.T @ m
+    sxx = (x * x).T @ m
+    sxy = x.T @ x
+    return common.astype(int), pearson(common, sx, sx.T, sxx, sxx.T, sxy)
+
+
+def krippendorff_alpha(table):
+    """Return Krippendorff's alpha for interval data over all submissions with at least two scores.
+
+    1 means perfect agreement, 0 agreement by chance. NaN is returned if there are no such submissions.
+    """
+    valid = table.scored()
+    ids = table.submission_ids[valid]
+    values = table.scores[valid]
+    counts = np.bincount(ids, minlength=len(table.submissions))
+    pairable = counts[ids] > 1
+    ids = ids[pairable]
+    values = values[pairable]
+    n = len(values)
+    if n < 2:
+        return math.nan
+    m = counts[counts > 1].astype(float)
+    sums = np.bincount(ids, weights=values, minlength=len(table.submissions))[counts > 1]
+    squares = np.bincount(ids, weights=values * values, minlength=len(table.submissions))[counts > 1]
+    # sum of squared differences of all ordered pairs of values within each submission
+    observed = np.sum(2 * (m * squares - sums * sums) / (m - 1)) / n
+    expected = 2 * (n * np.sum(values * values) - np.sum(values) ** 2) / (n * (n - 1))
+    if expected == 0:
+        return math.nan
+    return 1.0 - observed / expected
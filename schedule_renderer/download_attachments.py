@@ -4,19 +4,24 @@ import argparse
 import json
 import os.path
 import re
-import requests
 import sys
-from schedule_renderer.resource import Resource
+import time
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
 
-def should_store(resource, destination_directory):
-    path = resource.get_destination_path(destination_directory)
-    return not os.path.isfile(path)
+from schedule_renderer.download import Downloader, DownloadJob, write_summary
+from schedule_renderer.download_cache import CACHE_FILENAME, DownloadCache
+from schedule_renderer.resource import Resource
 
 
-parser = argparse.ArgumentParser(description="Download attachments from Pretalx")
+parser = argparse.ArgumentParser(description="Download attachments from Pretalx. Files present in the output directory are downloaded again only if they were modified on the server. ETag and Last-Modified headers of the downloads are kept in {} in the output directory.".format(CACHE_FILENAME))
+parser.add_argument("--backoff", type=float, help="delay before the first retry of a failed download in seconds, doubled with every further retry, defaults to 1", default=1.0)
 parser.add_argument("-d", "--description-filter", type=str, help="Download only attachments which match the provided regular expression")
-parser.add_argument("--nocache", action="store_true", help="download all files even if they are already present in the output directory")
+parser.add_argument("-j", "--jobs", type=int, help="maximum number of parallel downloads, defaults to 4", default=4)
+parser.add_argument("--chunk-size", type=int, help="size of the chunks written to disk in bytes, defaults to 1 MiB", default=1048576)
+parser.add_argument("--nocache", action="store_true", help="download all files even if they are already present in the output directory and not modified on the server")
+parser.add_argument("--per-host", type=int, help="maximum number of parallel downloads from the same host, defaults to 2", default=2)
+parser.add_argument("--retries", type=int, help="number of retries of a failed download, defaults to 3", default=3)
 parser.add_argument("-u", "--url-prefix", type=str, help="URL prefix for Pretalx (usually protocol and hostname only)", default="https://pretalx.com")
 parser.add_argument("json_export", type=argparse.FileType("r"), help="Pretalx API /talks response")
 parser.add_argument("destination_directory", type=str, help="destination_directory")
@@ -37,7 +42,8 @@ if args.description_filter:
     filter_re = re.compile(args.description_filter)
 
 count = 0
-count_downloaded = 0
+# jobs by destination path, resources stored at the same path are downloaded once
+jobs = {}
 for t in talks:
     resources = t.get("resources", [])
     resources = [ Resource(t["code"], args.url_prefix, **r) for r in resources ]
@@ -45,21 +51,22 @@ for t in talks:
         resources = [ r for r in resources if filter_re.search(r.description) ]
     count += len(resources)
     for r in resources:
-        if not args.nocache and not should_store(r, args.destination_directory):
-            sys.stderr.write("skip {} {}\n".format(t.get("code"), t.get("title")))
-            continue
         path = r.get_destination_path(args.destination_directory)
-        sys.stderr.write("downloading {} {} -> {}\n".format(r.code, r.url, path))
-        count_downloaded += 1
-        rr = requests.get(r.url, headers=headers)
-        if rr.status_code != 200:
-            sys.stderr.write("ERROR: HTTP status code {}\n".format(rr.status_code))
-            exit(1)
-        with open(path, "wb") as outfile:
-            for chunk in rr.iter_content(chunk_size=1024):
-                outfile.write(chunk)
+        jobs[path] = DownloadJob(r.url, path, r.code)
 
-if len(resources) == 0:
+if count == 0:
     sys.stderr.write("WARNING: The event has no resources or no resources are left after filtering.\n")
     exit(0)
-sys.stderr.write("{} resources found, {} were downloaded.\n".format(count, count_downloaded))
+
+start = time.monotonic()
+cache = DownloadCache.load(args.destination_directory)
+downloader = Downloader(headers, args.jobs, args.per_host, args.retries, args.backoff, cache=cache, conditional=not args.nocache, chunk_size=args.chunk_size)
+try:
+    results = downloader.run(list(jobs.values()))
+finally:
+    # keep the metadata of the files downloaded before an interruption
+    cache.save()
+sys.stderr.write("{} resources found.\n".format(count))
+failed = write_summary(results, count - len(jobs), time.monotonic() - start)
+if failed > 0:
+    exit(1)
@@ -2,42 +2,77 @@
 
 import argparse
 import json
+import os
 import os.path
 import re
-import requests
 import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
 import schedule_renderer.resource
-from schedule_renderer.video import Video
+from schedule_renderer.download import Downloader, DownloadJob, write_summary
+from schedule_renderer.download_cache import CACHE_FILENAME, DownloadCache
+from schedule_renderer.video import PREVIEWS_REPORT_FILENAME, Video
 
 
 def get_destination_path(destination_directory, clean_filename):
     return os.path.join(destination_directory, clean_filename)
 
 
-def should_store(destination_directory, clean_filename):
-    path = get_destination_path(destination_directory, clean_filename)
-    return not os.path.isfile(path)
+def build_jobs(videos, destination_directory):
+    """Return a list of (video code, preview kind, DownloadJob) tuples for the thumbnails and posters of all videos."""
+    jobs = []
+    for k, v in videos.items():
+        for kind, url in [("thumb", v.thumb_url), ("poster", v.poster_url)]:
+            fname = schedule_renderer.resource.filename_from_url(url)
+            path = get_destination_path(destination_directory, fname)
+            jobs.append((k, kind, DownloadJob(url, path, "{} {}".format(k, kind))))
+    return jobs
+
+
+def fetch_all(downloader, jobs):
+    """Download all jobs concurrently and return the results in the order of jobs.
+
+    Jobs with the same destination path are downloaded once.
+    """
+    unique = {}
+    for job in jobs:
+        unique.setdefault(job.path, job)
+    results = dict(zip(unique, downloader.run(list(unique.values()))))
+    return [ results[job.path] for job in jobs ]
 
 
-def fetch_and_save(code, url, filename, args):
-    fname = schedule_renderer.resource.filename_from_url(url)
-    if not args.nocache and not should_store(args.destination_directory, fname):
-        sys.stderr.write("skip as already cached: {}\n".format(code))
-        return
-    path = get_destination_path(args.destination_directory, fname)
-    sys.stderr.write("downloading {} {} -> {}\n".format(code, url, path))
-    rr = requests.get(url, headers=headers)
-    if rr.status_code != 200:
-        sys.stderr.write("ERROR: HTTP status code {}\n".format(rr.status_code))
-        exit(1)
-    with open(path, "wb") as outfile:
-        for chunk in rr.iter_content(chunk_size=1024):
-            outfile.write(chunk)
+def build_report(jobs, results):
+    """Return the result report: filename, URL and availability of the thumbnail and poster by video code.
 
+    A preview is available if a file exists locally, even if it could not be updated by this run.
+    """
+    videos = {}
+    for (code, kind, job), r in zip(jobs, results):
+        entry = {
+            "url": job.url,
+            "filename": os.path.basename(job.path),
+            "available": os.path.isfile(job.path),
+            "error": r.error if not r.ok else None,
+        }
+        videos.setdefault(code, {})[kind] = entry
+    return {"videos": videos}
 
 
-parser = argparse.ArgumentParser(description="Download video preview images from media.ccc.de")
-parser.add_argument("--nocache", action="store_true", help="download all files even if they are already present in the output directory")
+def write_report(path, report):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(report, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+parser = argparse.ArgumentParser(description="Download video preview images from media.ccc.de. Files present in the output directory are downloaded again only if they were modified on the server. ETag and Last-Modified headers of the downloads are kept in {} in the output directory.".format(CACHE_FILENAME))
+parser.add_argument("--chunk-size", type=int, help="size of the chunks written to disk in bytes, defaults to 1 MiB", default=1048576)
+parser.add_argument("-j", "--jobs", type=int, help="maximum number of parallel downloads, defaults to 8", default=8)
+parser.add_argument("--nocache", action="store_true", help="download all files even if they are already present in the output directory and not modified on the server")
+parser.add_argument("-r", "--report", type=str, help="path of the JSON report listing the previews available locally, to be passed to render_schedule.py. Defaults to {} in the output directory.".format(PREVIEWS_REPORT_FILENAME))
+parser.add_argument("--retries", type=int, help="number of retries of a failed download, defaults to 2", default=2)
 parser.add_argument("metadata_file", type=argparse.FileType("r"), help="Metadata from media.ccc.de in JSON format (https://media.ccc.de/public/conferences/CONFERENCE_SLUG")
 parser.add_argument("destination_directory", type=str, help="destination_directory")
 
@@ -50,7 +85,19 @@ if not os.path.isdir(args.destination_directory):
 data = json.load(args.metadata_file)
 videos = Video.load_media_ccc_de_json(data)
 headers = {"user-agent": "pretalx-scripts.download_video_previews/0.1"}
+cache = DownloadCache.load(args.destination_directory)
+downloader = Downloader(headers, args.jobs, args.jobs, args.retries, cache=cache, conditional=not args.nocache, chunk_size=args.chunk_size)
 
-for k, v in videos.items():
-    fetch_and_save(k, v.thumb_url, v.thumb_filename(), args)
-    fetch_and_save(k, v.poster_url, v.poster_filename(), args)
+start = time.monotonic()
+jobs = build_jobs(videos, args.destination_directory)
+try:
+    results = fetch_all(downloader, [ j[2] for j in jobs ])
+finally:
+    # keep the metadata of the files downloaded before an interruption
+    cache.save()
+
+report_path = args.report or os.path.join(args.destination_directory, PREVIEWS_REPORT_FILENAME)
+write_report(report_path, build_report(jobs, results))
+failed = write_summary(results, 0, time.monotonic() - start)
+if failed > 0:
+    exit(1)
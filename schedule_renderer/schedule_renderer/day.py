@@ -1,14 +1,20 @@
+def equal_day(d1, d2):
+    return d1.year == d2.year and d1.month == d2.month and d1.day == d2.day
+
+
 class Day:
     def __init__(self, date, room):
         self.date = date
         self.rooms = [room]
+        self.room_set = {room}
 
     def is_same_day(self, other):
         """Check if other is the same day (time does not matter)."""
         return other.year == self.date.year and other.month == self.date.month and other.day == self.date.day
 
     def add_room(self, room):
-        if room not in self.rooms:
+        if room not in self.room_set:
+            self.room_set.add(room)
             self.rooms.append(room)
 
     def sort_rooms(self):
@@ -19,3 +25,29 @@ class Day:
 
     def strftime(self, fmt):
         return self.date.strftime(fmt)
+
+
+class DayIndex:
+    """Days of the event keyed by their calendar date (in the time zone of the datetime used to look them up)."""
+    def __init__(self):
+        self.by_date = {}
+
+    def get(self, date):
+        """Return the day date belongs to or None."""
+        return self.by_date.get(date.date())
+
+    def add(self, date, room):
+        """Add room to the day date belongs to. The day is created if it does not exist yet."""
+        d = self.by_date.get(date.date())
+        if d is None:
+            self.by_date[date.date()] = Day(date, room)
+        else:
+            d.add_room(room)
+
+    def sort_rooms(self):
+        for d in self.by_date.values():
+            d.sort_rooms()
+
+    def sorted_days(self):
+        """Return a list of all days sorted by date."""
+        return sorted(self.by_date.values(), key=lambda d: d.date)
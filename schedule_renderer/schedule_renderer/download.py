@@ -0,0 +1,283 @@
+import concurrent.futures
+import hashlib
+import json
+import os
+import re
+import sys
+import threading
+import time
+import urllib.parse
+import requests
+
+# suffix of files being downloaded
+PART_SUFFIX = ".part"
+# suffix of the file next to a partial download storing what is needed to resume it
+PART_STATE_SUFFIX = ".json"
+
+# HTTP status codes which are worth a retry
+RETRY_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+
+
+def write_part_state(part_path, url, validator):
+    """Store URL and validator (ETag or Last-Modified) of a partial download atomically next to it.
+
+    The state is synced to disk, therefore the download can be resumed even after a crash or power loss.
+    """
+    state_path = part_path + PART_STATE_SUFFIX
+    tmp_path = state_path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump({"url": url, "validator": validator}, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, state_path)
+
+
+def read_part_validator(part_path, url):
+    """Return the validator of a partial download of an URL, None if it is unknown."""
+    try:
+        with open(part_path + PART_STATE_SUFFIX, "r") as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(state, dict) or state.get("url") != url:
+        return None
+    return state.get("validator")
+
+
+def remove_part_state(part_path):
+    try:
+        os.remove(part_path + PART_STATE_SUFFIX)
+    except FileNotFoundError:
+        pass
+
+
+def is_encoded(rr):
+    """Check if the body of a response has a content coding, e.g. gzip. Range offsets refer to the encoded body then."""
+    return rr.headers.get("Content-Encoding", "identity").strip().lower() not in ("", "identity")
+
+
+def content_range_start(rr):
+    """Return the first byte position of the Content-Range header of a response, None if it is missing or invalid."""
+    m = re.match(r"bytes\s+(\d+)-\d+/(\d+|\*)$", rr.headers.get("Content-Range", "").strip())
+    return int(m.group(1)) if m else None
+
+
+class DownloadJob:
+    """File to be downloaded.
+
+    Parameters
+    ----------
+    url : string
+        URL to download
+    path : string
+        destination path
+    label : string
+        label used for progress logging
+    """
+    def __init__(self, url, path, label):
+        self.url = url
+        self.path = path
+        self.label = label
+
+
+class DownloadResult:
+    """Outcome of a download job.
+
+    Parameters
+    ----------
+    job : DownloadJob
+        the job
+    ok : bool
+        the file was downloaded successfully
+    size : int
+        number of bytes written
+    attempts : int
+        number of requests sent
+    error : string
+        description of the error if the download failed
+    not_modified : bool
+        the server answered a conditional request with 304 Not Modified, the local file is up to date
+    """
+    def __init__(self, job, ok, size=0, attempts=0, error=None, not_modified=False):
+        self.job = job
+        self.ok = ok
+        self.size = size
+        self.attempts = attempts
+        self.error = error
+        self.not_modified = not_modified
+
+
+class Downloader:
+    """Download files concurrently using one pooled HTTP session per worker thread.
+
+    Parameters
+    ----------
+    headers : dict of string,string
+        HTTP headers sent with every request
+    jobs : int
+        maximum number of parallel downloads
+    per_host : int
+        maximum number of parallel downloads from the same host
+    retries : int
+        number of retries after connection errors, timeouts and HTTP status codes indicating a temporary failure
+    backoff : float
+        delay before the first retry in seconds, doubled with every further retry
+    timeout : float
+        connect and read timeout in seconds
+    cache : schedule_renderer.download_cache.DownloadCache
+        metadata of downloaded files, updated after every download
+    conditional : bool
+        send conditional requests for files known to the cache or present on disk
+    chunk_size : int
+        size of the chunks of the response body written to disk in bytes
+    """
+    def __init__(self, headers, jobs=4, per_host=2, retries=3, backoff=1.0, timeout=60.0, cache=None, conditional=True, chunk_size=1048576):
+        self.headers = headers
+        self.jobs = max(1, jobs)
+        self.per_host = max(1, per_host)
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.cache = cache
+        self.conditional = conditional
+        self.chunk_size = chunk_size
+        self.local = threading.local()
+        self.host_limits = {}
+        self.lock = threading.Lock()
+
+    def session(self):
+        """Return the HTTP session of the current thread."""
+        session = getattr(self.local, "session", None)
+        if session is None:
+            session = requests.Session()
+            session.headers.update(self.headers)
+            # The response body is written decoded, offsets of range requests refer to the encoded body.
+            session.headers["Accept-Encoding"] = "identity"
+            adapter = requests.adapters.HTTPAdapter(pool_connections=self.jobs, pool_maxsize=self.per_host)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            self.local.session = session
+        return session
+
+    def host_limit(self, url):
+        """Return the semaphore limiting the number of parallel downloads from the host of an URL."""
+        host = urllib.parse.urlsplit(url).netloc
+        with self.lock:
+            semaphore = self.host_limits.get(host)
+            if semaphore is None:
+                semaphore = threading.BoundedSemaphore(self.per_host)
+                self.host_limits[host] = semaphore
+        return semaphore
+
+    def resume_headers(self, part_path, validator):
+        """Return the headers to request the rest of a partially downloaded file, None if it cannot be resumed.
+
+        The validator (ETag or Last-Modified of the partial download) is sent as If-Range. Therefore, the server sends
+        the complete file if it was modified in the meantime.
+        """
+        if not validator:
+            return None
+        try:
+            offset = os.path.getsize(part_path)
+        except OSError:
+            return None
+        if offset == 0:
+            return None
+        return {"Range": "bytes={}-".format(offset), "If-Range": validator}
+
+    def save_response(self, job, rr, part_path, append):
+        """Stream the body of a response into the temporary file, move it into place and return its size.
+
+        The temporary file is synced to disk before it is renamed. Thus, the destination path never contains a
+        truncated file.
+        """
+        h = hashlib.sha256()
+        size = 0
+        if append:
+            with open(part_path, "rb") as f:
+                for chunk in iter(lambda: f.read(self.chunk_size), b""):
+                    h.update(chunk)
+                    size += len(chunk)
+        if not append:
+            validator = rr.headers.get("ETag") or rr.headers.get("Last-Modified")
+            if validator and not is_encoded(rr):
+                write_part_state(part_path, job.url, validator)
+            else:
+                remove_part_state(part_path)
+        with open(part_path, "ab" if append else "wb") as outfile:
+            for chunk in rr.iter_content(chunk_size=self.chunk_size):
+                outfile.write(chunk)
+                h.update(chunk)
+                size += len(chunk)
+            outfile.flush()
+            os.fsync(outfile.fileno())
+        os.replace(part_path, job.path)
+        remove_part_state(part_path)
+        if self.cache is not None:
+            self.cache.update(job.path, rr.headers, size, h.hexdigest())
+        return size
+
+    def fetch(self, job):
+        """Download a single file and return a DownloadResult.
+
+        The file is downloaded into a temporary file next to the destination path first. If a previous attempt or run
+        was interrupted, the download continues where it stopped, provided that the server supports range requests.
+        """
+        attempts = 0
+        error = None
+        part_path = job.path + PART_SUFFIX
+        validator = read_part_validator(part_path, job.url)
+        conditional_headers = {}
+        if self.cache is not None and self.conditional and not os.path.isfile(part_path):
+            conditional_headers = self.cache.conditional_headers(job.path)
+        while attempts <= self.retries:
+            if attempts > 0:
+                time.sleep(self.backoff * 2 ** (attempts - 1))
+            attempts += 1
+            request_headers = self.resume_headers(part_path, validator)
+            append = request_headers is not None
+            offset = os.path.getsize(part_path) if append else 0
+            if not append:
+                request_headers = conditional_headers
+            try:
+                with self.host_limit(job.url):
+                    sys.stderr.write("{} {} {} -> {}\n".format("resuming" if append else "downloading", job.label, job.url, job.path))
+                    with self.session().get(job.url, headers=request_headers, stream=True, timeout=self.timeout) as rr:
+                        if rr.status_code == 304 and conditional_headers and not append:
+                            return DownloadResult(job, True, attempts=attempts, not_modified=True)
+                        if append and (rr.status_code == 416 or (rr.status_code == 206 and (content_range_start(rr) != offset or is_encoded(rr)))):
+                            # The partial file is not a prefix of the file on the server or the server sent another
+                            # range or an encoded one. Start from scratch without counting this as a failed attempt.
+                            validator = None
+                            remove_part_state(part_path)
+                            attempts -= 1
+                            continue
+                        if rr.status_code not in (200, 206) or (rr.status_code == 206 and not append):
+                            error = "HTTP status code {}".format(rr.status_code)
+                            if rr.status_code in RETRY_STATUS_CODES:
+                                continue
+                            break
+                        if rr.status_code == 200:
+                            # used to resume if the connection breaks, encoded responses cannot be resumed
+                            validator = None if is_encoded(rr) else rr.headers.get("ETag") or rr.headers.get("Last-Modified")
+                        size = self.save_response(job, rr, part_path, rr.status_code == 206)
+                return DownloadResult(job, True, size, attempts)
+            except (requests.RequestException, OSError) as e:
+                error = str(e)
+        return DownloadResult(job, False, attempts=attempts, error=error)
+
+    def run(self, jobs):
+        """Download files and return a list of DownloadResult in the order of jobs."""
+        with concurrent.futures.ThreadPoolExecutor(self.jobs) as executor:
+            return list(executor.map(self.fetch, jobs))
+
+
+def write_summary(results, skipped, elapsed):
+    """Write a summary of download results to standard error and return the number of failed downloads."""
+    failed = [ r for r in results if not r.ok ]
+    not_modified = [ r for r in results if r.not_modified ]
+    size = sum(r.size for r in results)
+    for r in failed:
+        sys.stderr.write("ERROR: {} {}: {} (after {} attempts)\n".format(r.job.label, r.job.url, r.error, r.attempts))
+    sys.stderr.write("{} files downloaded ({:.1f} MiB), {} not modified, {} skipped, {} failed in {:.1f} seconds.\n".format(len(results) - len(failed) - len(not_modified), size / 1048576, len(not_modified), skipped, len(failed), elapsed))
+    return len(failed)
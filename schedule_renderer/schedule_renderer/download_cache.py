@@ -0,0 +1,95 @@
+import email.utils
+import json
+import os
+import os.path
+import threading
+from pretalx_common.files import file_digest
+
+CACHE_FILENAME = ".download_cache.json"
+
+
+class DownloadCache:
+    """HTTP validators (ETag, Last-Modified), size and content digest of the files downloaded into a directory.
+
+    The metadata is stored in a sidecar file in the directory. It is used to send conditional requests which the server
+    can answer with 304 Not Modified instead of the file.
+
+    Parameters
+    ----------
+    path : string
+        path of the sidecar file
+    entries : dict of string,dict
+        metadata by filename
+    """
+    def __init__(self, path, entries):
+        self.path = path
+        self.entries = entries
+        self.lock = threading.Lock()
+
+    def load(directory):
+        """Load the cache of a directory. A missing or unreadable sidecar file is treated as empty."""
+        path = os.path.join(directory, CACHE_FILENAME)
+        try:
+            with open(path, "r") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            data = {}
+        return DownloadCache(path, data.get("files", {}))
+
+    def key(self, path):
+        return os.path.relpath(path, os.path.dirname(self.path))
+
+    def is_valid(self, path, entry):
+        """Check if a file still has the size and content it had when it was downloaded."""
+        try:
+            st = os.stat(path)
+        except OSError:
+            return False
+        if st.st_size != entry.get("size"):
+            return False
+        if st.st_mtime_ns == entry.get("mtime_ns"):
+            return True
+        if file_digest(path) != entry.get("sha256"):
+            return False
+        entry["mtime_ns"] = st.st_mtime_ns
+        return True
+
+    def conditional_headers(self, path):
+        """Return request headers to download a file only if it was modified on the server.
+
+        Files without metadata, e.g. downloaded by an older version of the scripts, are checked against their
+        modification time. Nothing is returned if the file is missing or was modified locally.
+        """
+        with self.lock:
+            entry = self.entries.get(self.key(path))
+        if entry is None:
+            if not os.path.isfile(path):
+                return {}
+            return {"If-Modified-Since": email.utils.formatdate(os.path.getmtime(path), usegmt=True)}
+        if not self.is_valid(path, entry):
+            return {}
+        headers = {}
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def update(self, path, response_headers, size, sha256):
+        """Record the metadata of a downloaded file."""
+        entry = {
+            "etag": response_headers.get("ETag"),
+            "last_modified": response_headers.get("Last-Modified"),
+            "size": size,
+            "sha256": sha256,
+            "mtime_ns": os.stat(path).st_mtime_ns,
+        }
+        with self.lock:
+            self.entries[self.key(path)] = entry
+
+    def save(self):
+        tmp_path = self.path + ".tmp"
+        with self.lock:
+            with open(tmp_path, "w") as f:
+                json.dump({"files": self.entries}, f, indent=1, sort_keys=True)
+            os.replace(tmp_path, self.path)
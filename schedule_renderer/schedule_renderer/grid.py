@@ -0,0 +1,64 @@
+import bisect
+import datetime
+from .session import ContinuedSession
+from .slot import Slot
+
+
+def slot_boundaries(sessions, max_length):
+    """Return the sorted, deduplicated start and end times of all sessions as list of (start, end) tuples.
+
+    Intervals longer than max_length minutes are dropped because they are gaps between sessions (e.g. nights).
+    """
+    times = sorted({s.start for s in sessions} | {s.end for s in sessions})
+    max_delta = datetime.timedelta(minutes=max_length)
+    return [ (times[i], times[i+1]) for i in range(0, len(times) - 1) if times[i+1] - times[i] <= max_delta ]
+
+
+def build_slots(sessions, max_length):
+    """Build the rows of the schedule table.
+
+    Every session is added to the slot it starts in. Sessions spanning over more than one slot get a
+    ContinuedSession placeholder in the following slots and their row_count is set to the number of
+    rendered slots they span over. Slots without any content to be rendered are dropped.
+
+    Parameters
+    ----------
+    sessions : list of AbstractSession
+        sessions sorted by start and end
+    max_length : int
+        maximum length of a slot in minutes
+
+    Returns
+    -------
+    list of Slot
+    """
+    slots = [ Slot(start, end) for start, end in slot_boundaries(sessions, max_length) ]
+    if len(slots) == 0:
+        return slots
+    starts = [ s.start for s in slots ]
+
+    slot_index = 0
+    for s in sessions:
+        # Sessions whose start is not a slot boundary stay in the previous slot.
+        i = bisect.bisect_left(starts, s.start)
+        if i < len(starts) and starts[i] == s.start:
+            slot_index = i
+        # slots overlapping with this session
+        next_later = bisect.bisect_left(starts, s.end, lo=slot_index + 1)
+        s.row_count = next_later - slot_index
+        slots[slot_index].add_session(s)
+        for j in range(slot_index + 1, next_later):
+            slots[j].add_session(ContinuedSession(s.start, s.end, s.room))
+
+    # remove slots without content to be rendered
+    slots = [ s for s in slots if s.rendering_required() ]
+    starts = [ s.start for s in slots ]
+
+    # update row counts of sessions spanning over removed slots
+    for i, current_slot in enumerate(slots):
+        for s in current_slot.sessions:
+            if s.render_content and not s.is_break and s.end > current_slot.end:
+                j = bisect.bisect_left(starts, s.end, lo=i + 1)
+                if j < len(starts):
+                    s.row_count = j - i
+    return slots
@@ -0,0 +1,176 @@
+import datetime
+import enum
+import hashlib
+import jinja2
+import jinja2.meta
+import json
+import locale
+import markdown
+import os
+import os.path
+
+MANIFEST_FILENAME = ".render_manifest.json"
+
+# attributes only used to lay out the schedule table, they do not affect pages
+LAYOUT_ATTRIBUTES = {"row_count", "col_count"}
+
+
+def template_digest(template):
+    """Return a digest of the source of a template and of all templates it includes, extends or imports.
+
+    If a template references another template by a name computed at runtime, all templates of the environment are
+    hashed.
+    """
+    env = template.environment
+    h = hashlib.sha256()
+    seen = set()
+    queue = [template.name]
+    while queue:
+        name = queue.pop(0)
+        if name in seen:
+            continue
+        seen.add(name)
+        h.update(name.encode("utf-8") + b"\0")
+        try:
+            source = env.loader.get_source(env, name)[0]
+        except jinja2.TemplateNotFound:
+            h.update(b"missing\0")
+            continue
+        h.update(hashlib.sha256(source.encode("utf-8")).digest())
+        for ref in jinja2.meta.find_referenced_templates(env.parse(source)):
+            if ref is None:
+                queue += env.list_templates()
+            else:
+                queue.append(ref)
+    return h.hexdigest()
+
+
+def render_settings(autoescape, markdown_cache_directory):
+    """Return the settings of this run affecting the output of all pages.
+
+    The weekday filter uses the LC_TIME locale, the markdown_to_html filter depends on the version of the markdown
+    module.
+    """
+    return {
+        "autoescape": autoescape,
+        "lc_time": locale.setlocale(locale.LC_TIME),
+        "markdown": markdown.__version__,
+        "markdown_cache_directory": markdown_cache_directory,
+    }
+
+
+def object_attributes(o):
+    """Return the attributes of an object by name, including those stored in __slots__ of the class and its bases."""
+    result = dict(getattr(o, "__dict__", {}))
+    for cls in type(o).__mro__:
+        for name in cls.__dict__.get("__slots__", ()):
+            if name not in result and hasattr(o, name):
+                result[name] = getattr(o, name)
+    return result
+
+
+def serialize_object(o):
+    """Fallback for json.dumps turning objects of the session model into JSON serialisable values.
+
+    Tuples are serialised by json.dumps itself. Sets are sorted because their order differs between runs. Values of
+    other types raise a TypeError because their string representation may differ between runs or drop state.
+    """
+    if isinstance(o, (set, frozenset)):
+        return sorted(o, key=lambda v: json.dumps(v, sort_keys=True, default=serialize_object))
+    if isinstance(o, enum.Enum):
+        return "{}.{}".format(type(o).__name__, o.name)
+    if isinstance(o, datetime.tzinfo):
+        return str(o)
+    if isinstance(o, (datetime.datetime, datetime.date, datetime.time)):
+        return o.isoformat()
+    if isinstance(o, datetime.timedelta):
+        return o.total_seconds()
+    if hasattr(o, "__dict__") or hasattr(type(o), "__slots__"):
+        result = { k: v for k, v in object_attributes(o).items() if k not in LAYOUT_ATTRIBUTES }
+        result["__class__"] = type(o).__name__
+        return result
+    raise TypeError("{} objects cannot be serialised for the render manifest".format(type(o).__name__))
+
+
+def page_digest(page, template_digest, settings):
+    """Return a digest of everything a page depends on: its templates, the settings of the run and the variables passed to it.
+
+    The session objects are serialised including their talk dictionary, speaker details, resources and video.
+    """
+    data = json.dumps(page.context, sort_keys=True, default=serialize_object)
+    h = hashlib.sha256()
+    h.update(template_digest.encode("utf-8"))
+    h.update(json.dumps(settings, sort_keys=True).encode("utf-8"))
+    h.update(data.encode("utf-8"))
+    return h.hexdigest()
+
+
+class RenderManifest:
+    """Digests of the inputs of all pages rendered into an output directory by the previous run.
+
+    Parameters
+    ----------
+    path : string
+        path of the manifest file
+    entries : dict of string,dict
+        template name and digest by output filename
+    """
+    def __init__(self, path, entries):
+        self.path = path
+        self.old_entries = entries
+        self.entries = {}
+        self.template_names = set()
+
+    def load(directory):
+        """Load the manifest of an output directory. A missing or unreadable manifest is treated as empty."""
+        path = os.path.join(directory, MANIFEST_FILENAME)
+        try:
+            with open(path, "r") as f:
+                entries = json.load(f).get("pages", {})
+        except (OSError, ValueError):
+            entries = {}
+        return RenderManifest(path, entries)
+
+    def filter_outdated(self, pages, templates, settings):
+        """Return the pages which have to be rendered because their inputs changed or their output file is missing.
+
+        Parameters
+        ----------
+        pages : list of Page
+            all pages of this run
+        templates : dict of string,jinja2.Template
+            templates by name
+        settings : dict
+            settings of the run affecting all pages, see render_settings
+        """
+        self.template_names = set(templates)
+        template_digests = { name: template_digest(t) for name, t in templates.items() }
+        result = []
+        for p in pages:
+            name = os.path.basename(p.path)
+            digest = page_digest(p, template_digests[p.template_name], settings)
+            self.entries[name] = {"template": p.template_name, "digest": digest}
+            old = self.old_entries.get(name)
+            if old is None or old.get("digest") != digest or not os.path.isfile(p.path):
+                result.append(p)
+        return result
+
+    def stale(self):
+        """Return output filenames rendered by the previous run which do not belong to any page of this run.
+
+        Only pages of templates used by this run are considered.
+        """
+        return sorted(name for name, e in self.old_entries.items() if name not in self.entries and e.get("template") in self.template_names)
+
+    def keep(self, name):
+        """Keep the entry of a stale page in the manifest, e.g. because it was not removed."""
+        self.entries[name] = self.old_entries[name]
+
+    def save(self):
+        # keep entries of templates not rendered by this run
+        entries = { name: e for name, e in self.old_entries.items() if e.get("template") not in self.template_names }
+        entries.update(self.entries)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"pages": entries}, f, indent=1, sort_keys=True)
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,80 @@
+import collections
+import hashlib
+import markdown
+import os
+import os.path
+
+
+class MarkdownConverter:
+    """Convert Markdown to HTML using a single markdown.Markdown instance and cache the results by a hash of the input.
+
+    The results are kept in memory with least recently used eviction. Optionally, they are stored on disk as well and
+    used by later runs.
+
+    Parameters
+    ----------
+    max_entries : int
+        maximum number of results kept in memory
+    cache_directory : string
+        directory to store results in, no results are stored on disk if it is None
+    """
+    def __init__(self, max_entries=4096, cache_directory=None):
+        self.md = markdown.Markdown()
+        self.max_entries = max_entries
+        self.cache_directory = cache_directory
+        self.entries = collections.OrderedDict()
+        if cache_directory:
+            os.makedirs(cache_directory, exist_ok=True)
+
+    def cache_path(self, key):
+        return os.path.join(self.cache_directory, key[:2], key + ".html")
+
+    def load(self, key):
+        try:
+            with open(self.cache_path(key), "r", encoding="utf-8") as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def store(self, key, html):
+        path = self.cache_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # unique temporary file because pages may be rendered by multiple processes
+        tmp_path = "{}.{}.tmp".format(path, os.getpid())
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(html)
+        os.replace(tmp_path, path)
+
+    def convert(self, text, **kwargs):
+        """Convert Markdown to HTML. Calls with keyword arguments or a non-string input are passed to markdown.markdown."""
+        if kwargs or not isinstance(text, str):
+            return markdown.markdown(text, **kwargs)
+        # The output depends on the version of the markdown module.
+        key = hashlib.sha256("{}\0{}".format(markdown.__version__, text).encode("utf-8")).hexdigest()
+        html = self.entries.get(key)
+        if html is not None:
+            self.entries.move_to_end(key)
+            return html
+        if self.cache_directory:
+            html = self.load(key)
+        if html is None:
+            html = self.md.reset().convert(text)
+            if self.cache_directory:
+                self.store(key, html)
+        self.entries[key] = html
+        if len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+        return html
+
+
+# converters by cache directory
+converters = {}
+
+
+def markdown_converter(cache_directory=None):
+    """Return the converter shared by all templates using the same cache directory."""
+    converter = converters.get(cache_directory)
+    if converter is None:
+        converter = MarkdownConverter(cache_directory=cache_directory)
+        converters[cache_directory] = converter
+    return converter
@@ -0,0 +1,145 @@
+import multiprocessing
+import os.path
+import urllib.parse
+from pretalx_common.processes import fork_available
+from pretalx_common.templates import create_environment
+from .day import Day, equal_day
+from .markdown_cache import markdown_converter
+from .session import escape_yaml_value_quote
+
+
+def objtype(o):
+    return type(o)
+
+
+def template_environment(searchpath, autoescape=True, cache_directory=None, markdown_cache_directory=None):
+    """Build the Jinja2 environment for the schedule table, abstract and metasession pages."""
+    filters = {
+        "weekday": Day.weekday,
+        "equal_day": equal_day,
+        "e_yaml": escape_yaml_value_quote,
+        "e_url": urllib.parse.quote,
+        "markdown_to_html": markdown_converter(markdown_cache_directory).convert,
+        "type": objtype,
+    }
+    return create_environment(searchpath, cache_directory, autoescape, filters, trim_blocks=True)
+
+
+def template_searchpath(template_paths):
+    """Return the directories of the templates in their order without duplicates. None values are ignored."""
+    result = []
+    for p in template_paths:
+        if not p:
+            continue
+        d = os.path.dirname(os.path.abspath(p))
+        if d not in result:
+            result.append(d)
+    return result
+
+
+# environments by search path, autoescape setting and cache directories, Jinja2 recompiles their templates if the files are modified
+environments = {}
+
+
+def load_template(template_path, searchpath, autoescape=True, cache_directory=None, markdown_cache_directory=None):
+    """Load a template from the environment shared by all templates of a run.
+
+    If a directory earlier in the search path contains another template of the same filename, the template is loaded
+    from an environment of its own directory instead.
+
+    Parameters
+    ----------
+    template_path : string
+        path of the template
+    searchpath : list of string
+        directories of all templates, see template_searchpath
+    autoescape : bool
+        enable HTML autoescape
+    cache_directory : string
+        directory of the bytecode cache
+    markdown_cache_directory : string
+        directory to store HTML converted from Markdown in, converted HTML is cached in memory only if it is None
+    """
+    directory = os.path.dirname(os.path.abspath(template_path))
+    name = os.path.basename(template_path)
+    for d in searchpath:
+        if os.path.isfile(os.path.join(d, name)):
+            if d != directory:
+                searchpath = [directory]
+            break
+    key = (tuple(searchpath), autoescape, cache_directory, markdown_cache_directory)
+    env = environments.get(key)
+    if env is None:
+        env = template_environment(list(searchpath), autoescape, cache_directory, markdown_cache_directory)
+        environments[key] = env
+    return env.get_template(name)
+
+
+class Page:
+    """Page rendered into a file of its own, e.g. the abstract of a session.
+
+    Parameters
+    ----------
+    path : string
+        output path
+    template_name : string
+        key of the template in the template_paths dictionary passed to render_pages
+    label : string
+        label used for progress logging
+    context : dict
+        variables passed to the template
+    """
+    def __init__(self, path, template_name, label, context):
+        self.path = path
+        self.template_name = template_name
+        self.label = label
+        self.context = context
+
+
+# templates compiled once per worker process
+worker_templates = {}
+
+
+def init_worker(template_paths, searchpath, autoescape, cache_directory, markdown_cache_directory):
+    for name, path in template_paths.items():
+        worker_templates[name] = load_template(path, searchpath, autoescape, cache_directory, markdown_cache_directory)
+
+
+def render_in_worker(page):
+    return worker_templates[page.template_name].render(**page.context)
+
+
+def render_pages(pages, template_paths, autoescape=True, jobs=1, searchpath=None, cache_directory=None, markdown_cache_directory=None):
+    """Render pages and yield (page, text) tuples in the order of pages.
+
+    Parameters
+    ----------
+    pages : list of Page
+        pages to render
+    template_paths : dict of string,string
+        paths of the templates by name
+    autoescape : bool
+        enable HTML autoescape
+    jobs : int
+        number of worker processes, pages are rendered in this process if it is 1 or less or if worker processes cannot
+        be forked (see pretalx_common.processes.fork_available)
+    searchpath : list of string
+        search path of the shared template environment, defaults to the directories of template_paths
+    cache_directory : string
+        directory of the bytecode cache
+    markdown_cache_directory : string
+        directory to store HTML converted from Markdown in
+    """
+    if searchpath is None:
+        searchpath = template_searchpath(template_paths.values())
+    if jobs <= 1 or not fork_available():
+        templates = { name: load_template(path, searchpath, autoescape, cache_directory, markdown_cache_directory) for name, path in template_paths.items() }
+        for p in pages:
+            yield p, templates[p.template_name].render(**p.context)
+        return
+    # The scripts of this repository have no main guard, therefore worker processes must not re-import them.
+    ctx = multiprocessing.get_context("fork")
+    chunksize = max(1, len(pages) // (jobs * 4))
+    with ctx.Pool(jobs, initializer=init_worker, initargs=(template_paths, searchpath, autoescape, cache_directory, markdown_cache_directory)) as pool:
+        for p, text in zip(pages, pool.imap(render_in_worker, pages, chunksize)):
+            yield p, text
@@ -1,4 +1,6 @@
 class Question:
+    __slots__ = ("id", "question", "response")
+
     def __init__(self, question_id, question_text, response):
         self.id = question_id
         self.question = question_text
@@ -25,6 +25,8 @@ def get_destination_path(f, destination_directory):
 
 
 class Resource:
+    __slots__ = ("url", "description", "code", "href")
+
     def __init__(self, code, url_prefix, **kwargs):
         if kwargs["resource"].startswith("https://") or kwargs["resource"].startswith("http://"):
             self.url = kwargs["resource"]
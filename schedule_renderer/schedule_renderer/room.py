@@ -1,4 +1,6 @@
 class Room:
+    __slots__ = ("id", "name", "position", "occupied", "video")
+
     def __init__(self, room_id, name, position):
         self.id = room_id 
         self.name = name
@@ -1,14 +1,11 @@
+import bisect
 import datetime
 from enum import Enum
 from .question import Question
 from .speaker import Speaker
 from .resource import Resource
 
-PRETALX_DATE_FMT = "%Y-%m-%dT%H:%M:%S%z"
-
-def transform_pretalx_date(d):
-    """Remove last colon."""
-    return datetime.datetime.strptime(d[:22] + d[-2:], PRETALX_DATE_FMT)
+from pretalx_common.dates import parse_pretalx_date as transform_pretalx_date
 
 def url_to_code(u):
     parts = u.split("/")
@@ -36,6 +33,7 @@ class SessionType(Enum):
 
 
 class AbstractSession:
+    __slots__ = ("start", "end", "room", "render_content", "is_break", "render_abstract", "resources", "code", "frab_id", "speaker_names", "is_a_talk", "video", "row_count")
 
     def __init__(self, start, end, room):
         self.start = start
@@ -50,6 +48,7 @@ class AbstractSession:
         self.speaker_names = None
         self.is_a_talk = False
         self.video = None
+        self.row_count = 1
 
     def type(self):
         return SessionType.NONE
@@ -67,6 +66,8 @@ class AbstractSession:
 
 class ContinuedSession(AbstractSession):
     """second/third part of a session spanning over more than one slot"""
+    __slots__ = ()
+
     def __init__(self, start, end, room):
         super(ContinuedSession, self).__init__(start, end, room)
         self.render_content = False
@@ -81,6 +82,8 @@ class ContinuedSession(AbstractSession):
 
 
 class Break(AbstractSession):
+    __slots__ = ("title", "url")
+
     def __init__(self, start, end, room, name, url):
         super(Break, self).__init__(start, end, room)
         self.title = name
@@ -91,18 +94,26 @@ class Break(AbstractSession):
     def type(self):
         return SessionType.BREAK
 
-    def import_config(breaks, days, locale):
+    def import_config(breaks, day_index, locale):
+        """Build breaks from configuration, one per room used on the day of the break.
+
+        Parameters
+        ----------
+        breaks : list of dict
+            breaks as defined in the configuration file
+        day_index : DayIndex
+            days of the event
+        locale : string
+            locale, e.g. 'en'
+        """
         result = []
         utc = datetime.timezone(datetime.timedelta(hours=0))
         for b in breaks:
             start = transform_pretalx_date(b["start"]).astimezone(utc)
             end = transform_pretalx_date(b["end"]).astimezone(utc)
             url = b.get("url")
-            rooms = []
-            for d in days:
-                if d.is_same_day(start):
-                    rooms = d.rooms
-                    break
+            day = day_index.get(start)
+            rooms = day.rooms if day is not None else []
             name = b["name"][locale]
             for r in rooms:
                 result.append(Break(start, end, r, name, url))
@@ -114,6 +125,8 @@ class Break(AbstractSession):
 
 class ExtraSession(AbstractSession):
     """Session which is not managed by Pretalx but provided via a configuration file. This is intended for conference photos, social events and parallel conferences/tracks."""
+    __slots__ = ("title", "url")
+
     def __init__(self, start, end, room, title, url):
         super(ExtraSession, self).__init__(start, end, room)
         self.title = title
@@ -147,6 +160,8 @@ class ExtraSession(AbstractSession):
 
 class MetaSession(AbstractSession):
     """Session hosting multiple children sessions which is not managed by Pretalx but provided via a configuration file. This is intended for lightning talk sessions and similar short talks which would impair the overview table."""
+    __slots__ = ("talk", "title", "recording", "children")
+
     def __init__(self, start, end, room, title, code):
         super(MetaSession, self).__init__(start, end, room)
         self.talk = {"title": title}
@@ -165,7 +180,7 @@ class MetaSession(AbstractSession):
         self.recording = self.recording and self.recording
 
     def sort_children(self):
-        self.children.sort(key=lambda c : c.talk.get("start"))
+        self.children.sort(key=lambda c : c.start)
 
     def build(locale, rooms, **kwargs):
         """Factory function for ExtraSession class.
@@ -189,11 +204,76 @@ class MetaSession(AbstractSession):
 
 
 
+class MetaSessionIndex:
+    """Metasessions of each room sorted by start time to find the metasession a talk belongs to by binary search.
+
+    Parameters
+    ----------
+    metasessions : list of MetaSession
+        metasessions, if a talk is contained by multiple metasessions, the first one in this list wins
+    """
+    def __init__(self, metasessions):
+        self.rooms = {}
+        by_room = {}
+        for order, m in enumerate(metasessions):
+            by_room.setdefault(m.room.id, []).append((m.start, order, m))
+        for room_id, entries in by_room.items():
+            entries.sort(key=lambda e: (e[0], e[1]))
+            # maximum end of all metasessions up to this index, allows to stop scanning backwards early
+            max_ends = []
+            for e in entries:
+                max_ends.append(max(max_ends[-1], e[2].end) if max_ends else e[2].end)
+            self.rooms[room_id] = ([ e[0] for e in entries ], entries, max_ends)
+
+    def find(self, room_id, start, end):
+        """Return the metasession containing the interval and a list of metasessions overlapping only partially with it.
+
+        Parameters
+        ----------
+        room_id : int
+            room ID
+        start : datetime.datetime
+            start of the talk
+        end : datetime.datetime
+            end of the talk
+
+        Returns
+        -------
+        tuple of MetaSession or None, list of MetaSession
+        """
+        if room_id not in self.rooms:
+            return None, []
+        starts, entries, max_ends = self.rooms[room_id]
+        container = None
+        partial = []
+        # metasessions starting not later than the talk
+        i = bisect.bisect_right(starts, start)
+        j = i - 1
+        while j >= 0 and max_ends[j] > start:
+            m_start, order, m = entries[j]
+            if m.end >= end:
+                if container is None or order < container[0]:
+                    container = (order, m)
+            elif m.end > start:
+                partial.append(m)
+            j -= 1
+        # metasessions starting during the talk
+        for k in range(i, bisect.bisect_left(starts, end)):
+            partial.append(entries[k][2])
+        return (container[1] if container else None), partial
+
+
 class Session(AbstractSession):
-    def __init__(self, room, talk, locale, url_prefix, skip_questions=False):
-        super(Session, self).__init__(transform_pretalx_date(talk["start"]), transform_pretalx_date(talk["end"]), room)
+    """Session managed by Pretalx. The talk has to be prepared by pretalx_common.dates.parse_talk_times.
+
+    Only the properties of the talk used by templates are copied. The talk attribute is the talk dictionary itself
+    unless slim_talk is True. Then it is a dictionary with code and title only to save memory.
+    """
+    __slots__ = ("talk", "title", "submission_type", "short_abstract", "long_abstract", "speakers", "duration", "questions", "col_count", "recording", "supersession_code", "speaker_names_with_affiliations")
+
+    def __init__(self, room, talk, locale, url_prefix, skip_questions=False, slim_talk=False):
+        super(Session, self).__init__(talk["start_datetime"], talk["end_datetime"], room)
         self.room = room
-        self.talk = talk
         self.title = talk["title"]
         self.submission_type = talk["submission_type"][locale]
         self.short_abstract = talk.get("abstract")
@@ -215,6 +295,11 @@ class Session(AbstractSession):
         self.recording = not talk.get("do_not_record", True)
         self.resources = Resource.from_list(talk.get("resources", []), self.code, url_prefix)
         self.supersession_code = None
+        self.speaker_names_with_affiliations = []
+        if slim_talk:
+            self.talk = {"code": self.code, "title": self.title}
+        else:
+            self.talk = talk
 
     def type(self):
         return SessionType.NORMAL
@@ -1,4 +1,6 @@
 class Slot:
+    __slots__ = ("start", "end", "sessions")
+
     def __init__(self, start, end):
         self.start = start
         self.end = end
@@ -1,6 +1,8 @@
 from .question import Question
 
 class Speaker:
+    __slots__ = ("name", "code", "questions", "biography")
+
     def __init__(self, name, code):
         self.name = name
         self.code = code
@@ -1,6 +1,11 @@
 import schedule_renderer.resource
 
+# default filename of the report written by download_video_previews.py
+PREVIEWS_REPORT_FILENAME = "video_previews.json"
+
 class Video:
+    __slots__ = ("slug", "thumb_url", "poster_url", "frontend_link", "code", "thumb_file", "poster_file")
+
     def __init__(self, **kwargs):
         self.slug = kwargs["slug"]
         self.thumb_url = kwargs["thumb_url"]
@@ -11,6 +16,9 @@ class Video:
         self.code = link.split("/")[-1]
         if len(self.code) != 6:
             raise Exception("Session code in link property seems to be invalid, got \"{}\" but expected 6 alphanumeric characters.".format(self.code))
+        # filenames of the preview images if they are available locally
+        self.thumb_file = None
+        self.poster_file = None
 
     def load_media_ccc_de_json(data):
         videos = {}
@@ -24,3 +32,15 @@ class Video:
 
     def poster_filename(self):
         return schedule_renderer.resource.clean_filename(self.poster_url)
+
+    def set_previews(videos, report):
+        """Set thumb_file and poster_file of videos to the previews available locally according to the report of
+        download_video_previews.py."""
+        for code, previews in report.get("videos", {}).items():
+            v = videos.get(code)
+            if v is None:
+                continue
+            if previews.get("thumb", {}).get("available"):
+                v.thumb_file = previews["thumb"]["filename"]
+            if previews.get("poster", {}).get("available"):
+                v.poster_file = previews["poster"]["filename"]
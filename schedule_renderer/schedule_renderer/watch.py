@@ -0,0 +1,75 @@
+import os
+import time
+
+
+def modification_times(paths):
+    """Return modification times of files by path, None if a file does not exist."""
+    result = {}
+    for p in paths:
+        try:
+            result[p] = os.stat(p).st_mtime_ns
+        except OSError:
+            result[p] = None
+    return result
+
+
+class StageCache:
+    """Results of processing steps which are computed again only if one of the files they depend on was modified.
+
+    A disabled cache keeps no references to results, they can be freed as soon as the caller drops them.
+    """
+    def __init__(self, enabled=True):
+        self.results = {}
+        self.enabled = enabled
+
+    def get(self, name, paths, func, *args):
+        """Return the cached result of step name or call func(*args) if one of the paths was modified.
+
+        Paths which are None are ignored.
+        """
+        if not self.enabled:
+            return func(*args)
+        key = modification_times([ p for p in paths if p ])
+        cached = self.results.get(name)
+        if cached is not None and cached[0] == key:
+            return cached[1]
+        result = func(*args)
+        self.results[name] = (key, result)
+        return result
+
+
+class FileWatcher:
+    """Poll files for modifications.
+
+    Parameters
+    ----------
+    paths : list of string
+        files to watch, None values are ignored
+    interval : float
+        polling interval in seconds
+    """
+    def __init__(self, paths, interval=1.0):
+        self.paths = [ p for p in paths if p ]
+        self.interval = interval
+        self.snapshot = modification_times(self.paths)
+
+    def wait(self):
+        """Block until at least one file was modified and return the list of modified files.
+
+        Returns only after the modification times have been stable for one polling interval to avoid acting on
+        partially written files.
+        """
+        while True:
+            time.sleep(self.interval)
+            current = modification_times(self.paths)
+            if current != self.snapshot:
+                break
+        while True:
+            time.sleep(self.interval)
+            stable = modification_times(self.paths)
+            if stable == current:
+                break
+            current = stable
+        changed = [ p for p in self.paths if current[p] != self.snapshot[p] ]
+        self.snapshot = current
+        return changed
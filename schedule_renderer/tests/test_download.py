@@ -0,0 +1,138 @@
+import contextlib
+import hashlib
+import http.server
+import io
+import json
+import os
+import os.path
+import sys
+import tempfile
+import threading
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+
+from schedule_renderer.download import PART_STATE_SUFFIX, PART_SUFFIX, Downloader, DownloadJob
+from schedule_renderer.download_cache import DownloadCache
+
+BODY = bytes(range(256)) * 400
+ETAG = '"{}"'.format(hashlib.md5(BODY).hexdigest())
+
+
+class FileHandler(http.server.BaseHTTPRequestHandler):
+    """Serve BODY at every path. The behaviour for range requests is chosen by the test using server.mode."""
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def send_body(self, status, body, headers):
+        self.send_response(status)
+        for k, v in headers.items():
+            self.send_header(k, v)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.requests.append(dict(self.headers))
+            count = len(server.requests)
+        if server.mode == "unavailable" and count == 1:
+            return self.send_body(503, b"", {})
+        if self.headers.get("If-None-Match") == ETAG:
+            return self.send_body(304, b"", {"ETag": ETAG})
+        range_header = self.headers.get("Range")
+        if range_header and self.headers.get("If-Range") == ETAG:
+            offset = int(range_header.split("=")[1].rstrip("-"))
+            if server.mode == "wrong_range":
+                return self.send_body(206, BODY, {"ETag": ETAG, "Content-Range": "bytes 0-{}/{}".format(len(BODY) - 1, len(BODY))})
+            if offset >= len(BODY):
+                return self.send_body(416, b"", {"Content-Range": "bytes */{}".format(len(BODY))})
+            return self.send_body(206, BODY[offset:], {"ETag": ETAG, "Content-Range": "bytes {}-{}/{}".format(offset, len(BODY) - 1, len(BODY))})
+        self.send_body(200, BODY, {"ETag": ETAG})
+
+
+class DownloaderTest(unittest.TestCase):
+    def setUp(self):
+        self.server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), FileHandler)
+        self.server.daemon_threads = True
+        self.server.mode = None
+        self.server.requests = []
+        self.server.lock = threading.Lock()
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "file.pdf")
+        self.job = DownloadJob("http://127.0.0.1:{}/file.pdf".format(self.server.server_address[1]), self.path, "file")
+        self.stderr = contextlib.redirect_stderr(io.StringIO())
+        self.stderr.__enter__()
+
+    def tearDown(self):
+        self.stderr.__exit__(None, None, None)
+        self.server.shutdown()
+        self.server.server_close()
+        self.directory.cleanup()
+
+    def write_part(self, content):
+        """Leave a partial download with the validator of the server like an interrupted run."""
+        with open(self.path + PART_SUFFIX, "wb") as f:
+            f.write(content)
+        with open(self.path + PART_SUFFIX + PART_STATE_SUFFIX, "w") as f:
+            json.dump({"url": self.job.url, "validator": ETAG}, f)
+
+    def fetch(self, cache=None):
+        return Downloader({}, backoff=0.01, cache=cache).fetch(self.job)
+
+    def assertDownloaded(self, result):
+        self.assertTrue(result.ok, result.error)
+        with open(self.path, "rb") as f:
+            self.assertEqual(f.read(), BODY)
+        self.assertFalse(os.path.exists(self.path + PART_SUFFIX))
+        self.assertFalse(os.path.exists(self.path + PART_SUFFIX + PART_STATE_SUFFIX))
+
+    def test_download(self):
+        self.assertDownloaded(self.fetch())
+        self.assertEqual(self.server.requests[0].get("Accept-Encoding"), "identity")
+
+    def test_retry(self):
+        self.server.mode = "unavailable"
+        result = self.fetch()
+        self.assertDownloaded(result)
+        self.assertEqual(result.attempts, 2)
+
+    def test_resume(self):
+        self.write_part(BODY[:1000])
+        result = self.fetch()
+        self.assertDownloaded(result)
+        self.assertEqual(len(self.server.requests), 1)
+        self.assertEqual(self.server.requests[0].get("Range"), "bytes=1000-")
+        self.assertEqual(result.size, len(BODY))
+
+    def test_resume_wrong_content_range(self):
+        self.write_part(BODY[:1000])
+        self.server.mode = "wrong_range"
+        self.assertDownloaded(self.fetch())
+        self.assertEqual(len(self.server.requests), 2)
+        self.assertIsNone(self.server.requests[1].get("Range"))
+
+    def test_resume_not_satisfiable(self):
+        self.write_part(BODY + b"garbage")
+        self.assertDownloaded(self.fetch())
+        self.assertEqual(len(self.server.requests), 2)
+        self.assertIsNone(self.server.requests[1].get("Range"))
+
+    def test_not_modified(self):
+        cache = DownloadCache.load(self.directory.name)
+        self.assertDownloaded(self.fetch(cache))
+        result = self.fetch(cache)
+        self.assertTrue(result.ok)
+        self.assertTrue(result.not_modified)
+        self.assertEqual(self.server.requests[1].get("If-None-Match"), ETAG)
+        with open(self.path, "rb") as f:
+            self.assertEqual(f.read(), BODY)
+
+
+if __name__ == "__main__":
+    unittest.main()